@@ -2,6 +2,11 @@ from collections import deque
 import sys
 import operator
 import math
+import random
+import time
+import multiprocessing
+import signal
+import traceback
 
 """
 	Base class for unary constraints
@@ -70,6 +75,12 @@ class BinaryConstraint:
 			return self.var2
 		return self.var1
 
+	"""
+	Lists the values of otherDomain that cannot be paired with value assigned to var.
+	"""
+	def conflictingValues(self, var, value, otherDomain):
+		return [otherValue for otherValue in otherDomain if not self.isSatisfied(value, otherValue)]
+
 
 """
 	Implementation of BinaryConstraint
@@ -88,7 +99,7 @@ class NotEqualConstraint(BinaryConstraint):
 	Implementation of BinaryConstraint
 	Satisfied if both values are in different diagonals
 """
-class NotInDiagonalConstraint:
+class NotInDiagonalConstraint(BinaryConstraint):
 	def __init__(self, var1, var2, difference):
 		self.var1 = var1
 		self.var2 = var2
@@ -114,27 +125,265 @@ class NotInDiagonalConstraint:
 
 	def __repr__(self):
 	    return 'NotInDiagonalConstraint (%s, %s, %f)' % (str(self.var1), str(self.var2), int(self.difference))		
-		
+
+
+"""
+	Extensional form of a binary constraint for given domains.
+	Calls isSatisfied of the wrapped constraint once for every pair of values and keeps, for each value of
+	either variable, the frozenset of values of the other variable it can be paired with. Checks then become set
+	lookups and revise can test a whole domain for support with one isdisjoint call. Works for the constraint
+	classes above and any user subclass of BinaryConstraint. Pairs with a value outside the compiled domains
+	fall back to the wrapped constraint.
+"""
+class TableConstraint(BinaryConstraint):
+	def __init__(self, constraint, domain1, domain2):
+		self.var1 = constraint.var1
+		self.var2 = constraint.var2
+		self.constraint = constraint
+		supports1 = dict((value1, []) for value1 in domain1)
+		supports2 = dict((value2, []) for value2 in domain2)
+		for value1 in domain1:
+			for value2 in domain2:
+				if constraint.isSatisfied(value1, value2):
+					supports1[value1].append(value2)
+					supports2[value2].append(value1)
+		self.supports = {
+			self.var1: dict((value, frozenset(values)) for value, values in supports1.iteritems()),
+			self.var2: dict((value, frozenset(values)) for value, values in supports2.iteritems())
+		}
+
+	def isSatisfied(self, value1, value2):
+		supports = self.supports[self.var1].get(value1)
+		if supports is None or value2 not in self.supports[self.var2]:
+			return self.constraint.isSatisfied(value1, value2)
+		return value2 in supports
+
+	def conflictingValues(self, var, value, otherDomain):
+		supports = self.supports[var].get(value)
+		if supports is None:
+			return BinaryConstraint.conflictingValues(self, var, value, otherDomain)
+		return [otherValue for otherValue in otherDomain if otherValue not in supports]
+
+	def __repr__(self):
+	    return 'TableConstraint (%s)' % str(self.constraint)
+
+
+"""
+	Constraint over any number of variables requiring all of them to take different values.
+	One AllDifferentConstraint replaces the n * (n - 1) / 2 NotEqualConstraints of a group and is filtered as a whole:
+	unsupportedValues finds the values that cannot appear in any assignment of distinct values to the group (Regin's
+	matching-based filter), which also catches pigeonhole conflicts that pairwise arc consistency misses.
+	The last maximum matching found is kept in matching and reused as the starting point of the next call.
+"""
+class AllDifferentConstraint:
+	def __init__(self, *variables):
+		self.variables = list(variables)
+		self.matching = {}
+
+	def isSatisfied(self, values):
+		return len(set(values)) == len(values)
+
+	def affects(self, var):
+		return var in self.variables
+
+	"""
+	Gets the other variables of the group.
+	"""
+	def otherVariables(self, var):
+		return [otherVar for otherVar in self.variables if otherVar != var]
+
+	"""
+	Gets the equivalent pairwise NotEqualConstraints.
+	"""
+	def pairwise(self):
+		variables = self.variables
+		return [NotEqualConstraint(variables[i], variables[j]) for i in xrange(len(variables)) for j in xrange(i + 1, len(variables))]
+
+	"""
+	Finds the values that belong to no maximum matching between the variables and their values.
+	A matching covering every variable is grown by augmenting paths from the previous one. Orienting matched edges
+	from variable to value and the other edges from value to variable, an unmatched edge can still be used if its
+	variable and value lie in the same strongly connected component, or if its value can be reached from a value
+	left unmatched.
+
+	Args:
+		domains (dictionary<variable, iterable<value>>): the domain of every variable of the group
+	Returns:
+		list<tuple<variable, value>>
+		the values to remove, or None if the variables cannot all take different values
+	"""
+	def unsupportedValues(self, domains):
+		variables = self.variables
+		matching = {}
+		owner = {}
+		for var in variables:
+			value = self.matching.get(var)
+			if value is not None and value not in owner and value in domains[var]:
+				matching[var] = value
+				owner[value] = var
+		for var in variables:
+			if var not in matching and not self.augment(var, domains, matching, owner):
+				return None
+		self.matching = matching
+
+		# Nodes 0 .. n - 1 are the variables, the values are numbered after them.
+		n = len(variables)
+		valueIndex = {}
+		edges = [[] for var in variables]
+		for i, var in enumerate(variables):
+			for value in domains[var]:
+				if value not in valueIndex:
+					valueIndex[value] = len(edges)
+					edges.append([])
+				if value == matching[var]:
+					edges[i].append(valueIndex[value])
+				else:
+					edges[valueIndex[value]].append(i)
+
+		reached = set(valueIndex[value] for value in valueIndex if value not in owner)
+		frontier = list(reached)
+		while frontier:
+			node = frontier.pop()
+			for nextNode in edges[node]:
+				if nextNode not in reached:
+					reached.add(nextNode)
+					frontier.append(nextNode)
+
+		component = strongComponents(edges)
+		unsupported = []
+		for i, var in enumerate(variables):
+			for value in domains[var]:
+				node = valueIndex[value]
+				if value != matching[var] and node not in reached and component[node] != component[i]:
+					unsupported.append((var, value))
+		return unsupported
+
+	"""
+	Extends matching to cover var along the shortest augmenting path, if there is one.
+	"""
+	def augment(self, var, domains, matching, owner):
+		parent = {}
+		frontier = [var]
+		while frontier:
+			nextFrontier = []
+			for otherVar in frontier:
+				for value in domains[otherVar]:
+					if value in parent:
+						continue
+					parent[value] = otherVar
+					if value not in owner:
+						while True:
+							otherVar = parent[value]
+							previous = matching.get(otherVar)
+							matching[otherVar] = value
+							owner[value] = otherVar
+							if otherVar == var:
+								return True
+							value = previous
+					nextFrontier.append(owner[value])
+			frontier = nextFrontier
+		return False
+
+	def __repr__(self):
+	    return 'AllDifferentConstraint (%s)' % ', '.join(str(var) for var in self.variables)
+
+
+"""
+	Labels the strongly connected components of a directed graph with Tarjan's algorithm, run iteratively.
+
+	Args:
+		edges (list<list<int>>): the successors of every node
+	Returns:
+		list<int>
+		the component of every node
+"""
+def strongComponents(edges):
+	index = [None] * len(edges)
+	low = [0] * len(edges)
+	component = [None] * len(edges)
+	onStack = [False] * len(edges)
+	stack = []
+	counter = 0
+	components = 0
+	for root in xrange(len(edges)):
+		if index[root] is not None:
+			continue
+		index[root] = low[root] = counter
+		counter += 1
+		stack.append(root)
+		onStack[root] = True
+		work = [(root, 0)]
+		while work:
+			node, i = work[-1]
+			if i < len(edges[node]):
+				work[-1] = (node, i + 1)
+				nextNode = edges[node][i]
+				if index[nextNode] is None:
+					index[nextNode] = low[nextNode] = counter
+					counter += 1
+					stack.append(nextNode)
+					onStack[nextNode] = True
+					work.append((nextNode, 0))
+				elif onStack[nextNode] and index[nextNode] < low[node]:
+					low[node] = index[nextNode]
+			else:
+				work.pop()
+				if work and low[node] < low[work[-1][0]]:
+					low[work[-1][0]] = low[node]
+				if low[node] == index[node]:
+					while True:
+						member = stack.pop()
+						onStack[member] = False
+						component[member] = components
+						if member == node:
+							break
+					components += 1
+	return component
+
 
 class ConstraintSatisfactionProblem:
 	"""
 	Structure of a constraint satisfaction problem.
 	Variables and domains should be lists of equal length that have the same order.
 	varDomains is a dictionary mapping variables to possible domains.
+	AllDifferentConstraints given among the binary constraints are kept apart in allDifferentConstraints.
+	varConstraints, varAllDifferent and varUnaryConstraints map each variable to the constraints that affect it, and
+	varNeighbours maps each variable to the variables it shares a constraint with. They are built
+	once here so the solver never has to scan every constraint to find the ones affecting a variable.
 
 	Args:
 		variables (list<string>): a list of variable names
 		domains (list<set<value>>): a list of sets of domains for each variable
-		binaryConstraints (list<BinaryConstraint>): a list of binary constraints to satisfy
+		binaryConstraints (list<BinaryConstraint>): a list of binary constraints and AllDifferentConstraints to satisfy
 		unaryConstraints (list<BinaryConstraint>): a list of unary constraints to satisfy
 	"""
 	def __init__(self, variables, domains, binaryConstraints = [], unaryConstraints = []):
 		self.varDomains = {}
 		for i in xrange(len(variables)):
 			self.varDomains[variables[i]] = domains[i]
+		self.allDifferentConstraints = [c for c in binaryConstraints if isinstance(c, AllDifferentConstraint)]
+		if self.allDifferentConstraints:
+			binaryConstraints = [c for c in binaryConstraints if not isinstance(c, AllDifferentConstraint)]
 		self.binaryConstraints = binaryConstraints
 		self.unaryConstraints = unaryConstraints
 
+		self.varConstraints = { var: [] for var in self.varDomains }
+		self.varNeighbours = { var: set() for var in self.varDomains }
+		for constraint in binaryConstraints:
+			self.varConstraints.setdefault(constraint.var1, []).append(constraint)
+			self.varConstraints.setdefault(constraint.var2, []).append(constraint)
+			self.varNeighbours.setdefault(constraint.var1, set()).add(constraint.var2)
+			self.varNeighbours.setdefault(constraint.var2, set()).add(constraint.var1)
+		self.varAllDifferent = { var: [] for var in self.varDomains }
+		for constraint in self.allDifferentConstraints:
+			for var in constraint.variables:
+				self.varAllDifferent.setdefault(var, []).append(constraint)
+				self.varNeighbours.setdefault(var, set()).update(constraint.otherVariables(var))
+		self.varUnaryConstraints = { var: [] for var in self.varDomains }
+		for constraint in unaryConstraints:
+			self.varUnaryConstraints.setdefault(constraint.var, []).append(constraint)
+		self.arcConsistency = ArcConsistencyEngine()
+
 	def __repr__(self):
 	    return '---Variable Domains\n%s---Binary Constraints\n%s---Unary Constraints\n%s' % ( \
 	        ''.join([str(e) + ':' + str(self.varDomains[e]) + '\n' for e in self.varDomains]), \
@@ -142,20 +391,227 @@ class ConstraintSatisfactionProblem:
 	        ''.join([str(e) + '\n' for e in self.binaryConstraints]))
 
 
+class RemainingValuesBuckets:
+	"""
+	Incrementally maintained ordering of the unassigned variables of an assignment for the minimum remaining
+	values heuristic. buckets[size] holds the unassigned variables with size values left and minSize is a lower
+	bound on the smallest non-empty bucket, so a variable is selected without scanning the other variables.
+	degrees counts the constraints from each variable to unassigned variables, an AllDifferentConstraint counting
+	once per other variable of the group, and is kept up to date on assign and unassign. ranks records the order of
+	the domain dictionary, so ties are broken as the full scan did.
+	The assignment moves variables between buckets whenever it prunes, restores, assigns or unassigns.
+
+	Args:
+		assignment (Assignment): the partial assignment to track
+		csp (ConstraintSatisfactionProblem): the problem definition
+	"""
+	def __init__(self, assignment, csp):
+		self.neighbours = {}
+		for var in csp.varDomains:
+			self.neighbours[var] = [bc.otherVariable(var) for bc in csp.varConstraints.get(var, ())] + \
+				[otherVar for constraint in csp.varAllDifferent.get(var, ()) for otherVar in constraint.otherVariables(var)]
+		self.ranks = {}
+		self.sizes = {}
+		self.degrees = {}
+		self.buckets = [set()]
+		self.minSize = 0
+		for rank, var in enumerate(assignment.varDomains):
+			self.ranks[var] = rank
+			self.sizes[var] = None
+			if not assignment.isAssigned(var):
+				self.insert(var, len(assignment.varDomains[var]))
+		for var in self.ranks:
+			self.degrees[var] = sum(1 for otherVar in self.neighbours.get(var, ()) if self.sizes.get(otherVar) is not None)
+
+	def insert(self, var, size):
+		buckets = self.buckets
+		while len(buckets) <= size:
+			buckets.append(set())
+		buckets[size].add(var)
+		self.sizes[var] = size
+		if size < self.minSize:
+			self.minSize = size
+
+	def remove(self, var):
+		self.buckets[self.sizes[var]].remove(var)
+		self.sizes[var] = None
+
+	"""
+	Moves var to the bucket of its new domain size. Assigned variables are not tracked and are left alone.
+	"""
+	def resize(self, var, size):
+		if self.sizes[var] is not None:
+			self.remove(var)
+			self.insert(var, size)
+
+	def assign(self, var):
+		if self.sizes[var] is not None:
+			self.remove(var)
+			degrees = self.degrees
+			for otherVar in self.neighbours.get(var, ()):
+				degrees[otherVar] -= 1
+
+	def unassign(self, var, size):
+		if self.sizes[var] is None:
+			self.insert(var, size)
+			degrees = self.degrees
+			for otherVar in self.neighbours.get(var, ()):
+				degrees[otherVar] += 1
+
+	"""
+	Gets the unassigned variables with the fewest remaining values and, among those, the most constraints
+	to unassigned variables. Empty buckets below the minimum are skipped once, so selection is amortized constant
+	time apart from the degree comparison, which only runs when several variables share the smallest domain.
+
+	Returns:
+		list<variable>
+		the tied variables in the order of the domain dictionary
+	"""
+	def candidates(self):
+		buckets = self.buckets
+		size = self.minSize
+		while size < len(buckets) and not buckets[size]:
+			size += 1
+		self.minSize = size
+		if size == len(buckets):
+			return []
+		bucket = buckets[size]
+		if len(bucket) == 1:
+			return list(bucket)
+		degrees = self.degrees
+		maxDeg = max(degrees[var] for var in bucket)
+		return sorted((var for var in bucket if degrees[var] == maxDeg), key=self.ranks.__getitem__)
+
+
 class Assignment:
 	"""
 	Representation of a partial assignment.
 	Has the same varDomains dictionary stucture as ConstraintSatisfactionProblem.
 	Keeps a second dictionary from variables to assigned values, with None being no assignment.
+	Values pruned from the domains are logged on a trail of (variable, value) pairs, and trailLevels holds
+	the trail length at each open decision so backtracking can restore the domains by popping the trail.
+	stats is the SearchStats that assign, unassign and consistent report to, None when nothing is recorded.
+	constraintWeights counts, for domainOverWeightedDegree, one plus the number of domain wipeouts each constraint caused.
+	remainingValues is the RemainingValuesBuckets used by minimumRemainingValuesHeuristic. It is built on first
+	use and kept up to date from then on, so after that domains should only change through prune and undo and
+	assignments only through assign and unassign. assignedVariables holds the variables assigned through assign,
+	so that snapshot does not have to scan every variable.
 
 	Args:
 		csp (ConstraintSatisfactionProblem): the problem definition for this assignment
+		snapshot (AssignmentSnapshot): optional state to start from, as taken by snapshot
 	"""
-	def __init__(self, csp):
+	def __init__(self, csp, snapshot=None):
 		self.varDomains = {}
 		for var in csp.varDomains:
 			self.varDomains[var] = set(csp.varDomains[var])
 		self.assignedValues = { var: None for var in self.varDomains }
+		self.assignedVariables = set()
+		self.trail = []
+		self.trailLevels = []
+		self.remainingValues = None
+		self.stats = None
+		self.constraintWeights = {}
+		if snapshot is not None:
+			# Replayed through prune so that the trail describes the state again and snapshots of this assignment stay complete.
+			for var, domain in snapshot.varDomains.iteritems():
+				for value in [value for value in self.varDomains[var] if value not in domain]:
+					self.prune(var, value)
+			for var, value in snapshot.assignedValues.iteritems():
+				self.assign(var, value)
+
+	"""
+	Removes a value from the domain of a variable and records the removal on the trail.
+
+	Args:
+		var (string): the variable to prune
+		value (value): the value to remove from the domain of var
+	Returns:
+		int
+		the number of values left in the domain of var
+	"""
+	def prune(self, var, value):
+		domain = self.varDomains[var]
+		domain.remove(value)
+		self.trail.append((var, value))
+		if self.remainingValues is not None:
+			self.remainingValues.resize(var, len(domain))
+		return len(domain)
+
+	"""
+	Restores every value pruned since the trail had length mark.
+
+	Args:
+		mark (int): a previous length of the trail
+	"""
+	def undo(self, mark):
+		trail = self.trail
+		varDomains = self.varDomains
+		remainingValues = self.remainingValues
+		while len(trail) > mark:
+			var, value = trail.pop()
+			varDomains[var].add(value)
+			if remainingValues is not None:
+				remainingValues.resize(var, len(varDomains[var]))
+
+	"""
+	Opens a decision level. Everything pruned until the matching popLevel is restored by it.
+	"""
+	def pushLevel(self):
+		self.trailLevels.append(len(self.trail))
+
+	"""
+	Closes the innermost decision level, restoring every value pruned since it was opened.
+	"""
+	def popLevel(self):
+		self.undo(self.trailLevels.pop())
+
+	"""
+	Closes the innermost decision level, keeping the values pruned since it was opened in the level around it.
+	"""
+	def commitLevel(self):
+		self.trailLevels.pop()
+
+	"""
+	Gets the values pruned since the trail had length mark in the inference format used by
+	forwardChecking and maintainArcConsistency, whether or not decision levels are open.
+
+	Args:
+		mark (int): a previous length of the trail
+	Returns:
+		set<tuple<variable, value>>
+		the inferences recorded since mark
+	"""
+	def inferencesSince(self, mark):
+		return set(self.trail[mark:])
+
+	"""
+	Records that constraint caused a domain wipeout.
+	"""
+	def bumpWeight(self, constraint):
+		self.constraintWeights[constraint] = self.constraintWeights.get(constraint, 1) + 1
+
+	"""
+	Assigns value to var.
+	"""
+	def assign(self, var, value):
+		self.assignedValues[var] = value
+		self.assignedVariables.add(var)
+		if self.remainingValues is not None:
+			self.remainingValues.assign(var)
+		if self.stats is not None:
+			self.stats.enterNode(self, var, value)
+
+	"""
+	Removes the value assigned to var, if any.
+	"""
+	def unassign(self, var):
+		if self.stats is not None and self.assignedValues[var] is not None:
+			self.stats.leaveNode()
+		self.assignedValues[var] = None
+		self.assignedVariables.discard(var)
+		if self.remainingValues is not None:
+			self.remainingValues.unassign(var, len(self.varDomains[var]))
 
 	"""
 	Determines whether this variable has been assigned.
@@ -194,6 +650,20 @@ class Assignment:
 			return None
 		return self.assignedValues
 
+	"""
+	Takes an immutable copy of the domains and assigned values, in time linear in the length of the trail
+	rather than in the size of the problem. Only changes made through prune and assign are seen.
+
+	Returns:
+		AssignmentSnapshot
+		the current state, for Assignment(csp, snapshot) to start from again
+	"""
+	def snapshot(self):
+		varDomains = self.varDomains
+		changed = set(var for var, value in self.trail)
+		return AssignmentSnapshot(dict((var, frozenset(varDomains[var])) for var in changed), \
+			dict((var, self.assignedValues[var]) for var in self.assignedVariables))
+
 	def __repr__(self):
 	    return '---Variable Domains\n%s---Assigned Values\n%s' % ( \
 	        ''.join([str(e) + ':' + str(self.varDomains[e]) + '\n' for e in self.varDomains]), \
@@ -201,6 +671,109 @@ class Assignment:
 
 
 
+class AssignmentSnapshot:
+	"""
+	Immutable state of an Assignment, taken by Assignment.snapshot.
+	varDomains only holds the variables whose domain differs from the one in the problem, as frozensets, and every other
+	domain is shared with the ConstraintSatisfactionProblem rather than copied, so a snapshot costs memory in proportion
+	to the variables changed. It is pickled as two tuples of those domains and the assigned values, which keeps partial
+	assignments cheap to hand to other processes, e.g. the branches made by splitAssignment.
+	"""
+	def __init__(self, varDomains, assignedValues):
+		self.varDomains = varDomains
+		self.assignedValues = assignedValues
+
+	"""
+	Gets the domain of a variable in this snapshot.
+	"""
+	def domain(self, csp, var):
+		return self.varDomains.get(var, csp.varDomains[var])
+
+	def __getstate__(self):
+		return tuple((var, tuple(domain)) for var, domain in self.varDomains.iteritems()), tuple(self.assignedValues.iteritems())
+
+	def __setstate__(self, state):
+		varDomains, assignedValues = state
+		self.varDomains = dict((var, frozenset(domain)) for var, domain in varDomains)
+		self.assignedValues = dict(assignedValues)
+
+	def __repr__(self):
+	    return '---Changed Domains\n%s---Assigned Values\n%s' % ( \
+	        ''.join([str(e) + ':' + str(set(self.varDomains[e])) + '\n' for e in self.varDomains]), \
+	        ''.join([str(e) + ':' + str(self.assignedValues[e]) + '\n' for e in self.assignedValues]))
+
+
+class SearchStats:
+	"""
+	Counters and timings of one solve.
+	nodes counts the values assigned by the search, backtracks the assignments taken back again and maxDepth the
+	most variables the search had assigned at once. consistencyChecks counts calls to consistent and revisions the
+	arcs and AllDifferentConstraints revised by the ArcConsistencyEngine. prunedValues maps the name of each
+	inference step to the number of values it removed, and times maps each phase of solve to its wall time in seconds.
+	nodeCallback, if given, is called with the assignment, variable and value at every node.
+	"""
+	def __init__(self, nodeCallback=None):
+		self.nodes = 0
+		self.backtracks = 0
+		self.consistencyChecks = 0
+		self.revisions = 0
+		self.prunedValues = {}
+		self.depth = 0
+		self.maxDepth = 0
+		self.times = {}
+		self.nodeCallback = nodeCallback
+		self.clock = time.time()
+
+	def enterNode(self, assignment, var, value):
+		self.nodes += 1
+		self.depth += 1
+		if self.depth > self.maxDepth:
+			self.maxDepth = self.depth
+		if self.nodeCallback is not None:
+			self.nodeCallback(assignment, var, value)
+
+	def leaveNode(self):
+		self.depth -= 1
+		self.backtracks += 1
+
+	def addPruned(self, method, count):
+		self.prunedValues[method] = self.prunedValues.get(method, 0) + count
+
+	"""
+	Adds the counters and times of another solve, e.g. of a component solved in a worker process.
+	Components are assigned side by side, so their depths add up too.
+	"""
+	def merge(self, other):
+		self.nodes += other.nodes
+		self.backtracks += other.backtracks
+		self.consistencyChecks += other.consistencyChecks
+		self.revisions += other.revisions
+		for method, count in other.prunedValues.items():
+			self.addPruned(method, count)
+		self.maxDepth += other.maxDepth
+		for phase, seconds in other.times.items():
+			self.times[phase] = self.times.get(phase, 0.0) + seconds
+
+	"""
+	Adds the time since the previous phase ended to phase.
+	"""
+	def endPhase(self, phase):
+		now = time.time()
+		self.times[phase] = self.times.get(phase, 0.0) + now - self.clock
+		self.clock = now
+
+	"""
+	Gets the counters as a dictionary of plain values, e.g. for json.
+	"""
+	def asDict(self):
+		return {'nodes': self.nodes, 'backtracks': self.backtracks, 'consistencyChecks': self.consistencyChecks, \
+			'revisions': self.revisions, 'prunedValues': dict(self.prunedValues), 'maxDepth': self.maxDepth, \
+			'times': dict(self.times)}
+
+	def __repr__(self):
+	    return '---Search Statistics\n%s' % ''.join(['%s:%s\n' % (key, value) for key, value in sorted(self.asDict().items())])
+
+
 ####################################################################################################
 
 
@@ -221,13 +794,18 @@ class Assignment:
 def consistent(assignment, csp, var, value):
  	"""Question 1"""
  	isConsist = True
-	for bc in csp.binaryConstraints: 
-		if bc.affects(var):
-			otherVar = bc.otherVariable(var)
-			#print("otherVar ", otherVar)
-			if assignment.isAssigned(otherVar):
-				#print (assignment.assignedValues[otherVar])
-				isConsist = isConsist & bc.isSatisfied(value, assignment.assignedValues[otherVar])
+	if assignment.stats is not None:
+		assignment.stats.consistencyChecks += 1
+	for bc in csp.varConstraints[var]:
+		otherVar = bc.otherVariable(var)
+		#print("otherVar ", otherVar)
+		if assignment.isAssigned(otherVar):
+			#print (assignment.assignedValues[otherVar])
+			isConsist = isConsist & bc.isSatisfied(value, assignment.assignedValues[otherVar])
+	for constraint in csp.varAllDifferent[var]:
+		for otherVar in constraint.otherVariables(var):
+			if assignment.assignedValues[otherVar] == value:
+				return False
 	return isConsist
 
 
@@ -260,11 +838,11 @@ def recursiveBacktracking(assignment, csp, orderValuesMethod, selectVariableMeth
 	for value in orderValuesMethod(assignment, csp, var):
 		oldValue = assignment.assignedValues[var]
 		if consistent(assignment, csp, var, value):
-			assignment.assignedValues[var] = value
+			assignment.assign(var, value)
 		 	result = recursiveBacktracking(assignment, csp, orderValuesMethod, selectVariableMethod)
 		 	if not result == None:
 		 		return result
-		assignment.assignedValues[var] = None
+		assignment.unassign(var)
 	return None
 			
 
@@ -282,10 +860,9 @@ def recursiveBacktracking(assignment, csp, orderValuesMethod, selectVariableMeth
 def eliminateUnaryConstraints(assignment, csp):
 	domains = assignment.varDomains
 	for var in domains:
-		for constraint in (c for c in csp.unaryConstraints if c.affects(var)):
+		for constraint in csp.varUnaryConstraints[var]:
 			for value in (v for v in list(domains[var]) if not constraint.isSatisfied(v)):
-				domains[var].remove(value)
-				if len(domains[var]) == 0:
+				if assignment.prune(var, value) == 0:
 				 	# Failure due to invalid assignment
 				 	return None
 	return assignment
@@ -304,6 +881,8 @@ def chooseFirstVariable(assignment, csp):
 """
 	Selects the next variable to try to give a value to in an assignment.
 	Uses minimum remaining values heuristic to pick a variable. Use degree heuristic for breaking ties.
+	The domain sizes and degrees are read from the RemainingValuesBuckets of the assignment, which is built
+	on the first call and updated by the assignment afterwards instead of rescanning every variable per node.
 
 	Args:
 		assignment (Assignment): the partial assignment to expand
@@ -312,32 +891,47 @@ def chooseFirstVariable(assignment, csp):
 		the next variable to assign
 """
 def minimumRemainingValuesHeuristic(assignment, csp):
-	nextVar = None
-	minRV = sys.maxint
-	varList = []
-	for variable in assignment.varDomains:
-		if not assignment.isAssigned(variable):
-			remainingValues = len(assignment.varDomains[variable])
-			if remainingValues <= minRV:
-				minRV = remainingValues
-			varList.append((variable, remainingValues))
-
-	varList = filter(lambda x: x[1] == minRV, varList)
+	if assignment.remainingValues is None:
+		assignment.remainingValues = RemainingValuesBuckets(assignment, csp)
+	candidates = assignment.remainingValues.candidates()
+	if candidates:
+		return candidates[0]
 
-	maxDeg = 0
-	for i in range(len(varList)):
-		unassignedVars = 0
-		for bc in [bc for bc in csp.binaryConstraints if bc.affects(varList[i][0])]: 
-			otherVar = bc.otherVariable(varList[i][0])
-			if assignment.isAssigned(otherVar) != True:
-				unassignedVars += 1
-		varList[i] = (varList[i][0], unassignedVars)
-
-	varList = sorted(varList, key=lambda x: x[1], reverse = True)
-	nextVar = varList[0][0]
 
+"""
+	Selects the next variable to assign by the dom/wdeg heuristic: the smallest ratio of remaining values to
+	weighted degree. The weighted degree of a variable sums the weights in assignment.constraintWeights of its
+	constraints that still involve another unassigned variable. forwardChecking and the ArcConsistencyEngine add
+	one to the weight of a constraint each time it wipes out a domain, so the search learns to start with the
+	variables of the constraints that keep failing. Variables without such constraints come last, and the
+	remaining ties go to the first variable in the domain dictionary.
 
-	return nextVar
+	Args:
+		assignment (Assignment): the partial assignment to expand
+		csp (ConstraintSatisfactionProblem): the problem description
+	Returns:
+		the next variable to assign
+"""
+def domainOverWeightedDegree(assignment, csp):
+	return min(domainOverWeightedDegreeScores(assignment, csp), key=operator.itemgetter(1))[0]
+
+def domainOverWeightedDegreeScores(assignment, csp):
+	weights = assignment.constraintWeights
+	assignedValues = assignment.assignedValues
+	scores = []
+	for var in assignment.varDomains:
+		if assignedValues[var] is not None:
+			continue
+		weightedDegree = 0
+		for bc in csp.varConstraints[var]:
+			if assignedValues[bc.otherVariable(var)] is None:
+				weightedDegree += weights.get(bc, 1)
+		for constraint in csp.varAllDifferent[var]:
+			if any(assignedValues[otherVar] is None for otherVar in constraint.otherVariables(var)):
+				weightedDegree += weights.get(constraint, 1)
+		size = len(assignment.varDomains[var])
+		scores.append((var, (weightedDegree == 0, float(size) / weightedDegree if weightedDegree else size)))
+	return scores
 
 
 """
@@ -367,9 +961,10 @@ def leastConstrainingValuesHeuristic(assignment, csp, var):
 	valList = []
 	for val in assignment.varDomains[var]:
 		constrainedValTotal = 0
-		for bc in [bc for bc in csp.binaryConstraints if bc.affects(var)]:
+		for bc in csp.varConstraints[var]:
 			otherVar = bc.otherVariable(var)
 			constrainedValTotal += leastConstrainingValuesHelper(assignment, bc, var, val, otherVar)
+		constrainedValTotal += allDifferentConflicts(assignment, csp, var, val)
 		valList.append((val, constrainedValTotal))
 
 	valList = sorted(valList, key = lambda x: x[1])
@@ -377,12 +972,54 @@ def leastConstrainingValuesHeuristic(assignment, csp, var):
 	return valList
 
 def leastConstrainingValuesHelper(assignment, bc, var, currVal, otherVar):
-	constrainedVals = 0
-	for otherValue in list(assignment.varDomains[otherVar]):
-		if not bc.isSatisfied(currVal, otherValue):
-			constrainedVals += 1
+	return len(bc.conflictingValues(var, currVal, assignment.varDomains[otherVar]))
 
-	return constrainedVals
+def allDifferentConflicts(assignment, csp, var, currVal):
+	return sum(1 for constraint in csp.varAllDifferent[var] for otherVar in constraint.otherVariables(var) \
+		if currVal in assignment.varDomains[otherVar])
+
+
+"""
+	Randomized counterparts of chooseFirstVariable, orderValues, minimumRemainingValuesHeuristic,
+	leastConstrainingValuesHeuristic and domainOverWeightedDegree. They rank the candidates the same way but break the remaining ties
+	uniformly at random with the random module, so seeding it with random.seed makes a run reproducible.
+"""
+def randomVariable(assignment, csp):
+	return random.choice([var for var in assignment.varDomains if not assignment.isAssigned(var)])
+
+def randomOrderValues(assignment, csp, var):
+	values = list(assignment.varDomains[var])
+	random.shuffle(values)
+	return values
+
+def randomMinimumRemainingValuesHeuristic(assignment, csp):
+	if assignment.remainingValues is None:
+		assignment.remainingValues = RemainingValuesBuckets(assignment, csp)
+	return random.choice(assignment.remainingValues.candidates())
+
+def randomLeastConstrainingValuesHeuristic(assignment, csp, var):
+	valList = []
+	for val in assignment.varDomains[var]:
+		constrainedValTotal = 0
+		for bc in csp.varConstraints[var]:
+			constrainedValTotal += leastConstrainingValuesHelper(assignment, bc, var, val, bc.otherVariable(var))
+		constrainedValTotal += allDifferentConflicts(assignment, csp, var, val)
+		valList.append((constrainedValTotal, random.random(), val))
+	valList.sort()
+	return [x[2] for x in valList]
+
+def randomDomainOverWeightedDegree(assignment, csp):
+	scores = domainOverWeightedDegreeScores(assignment, csp)
+	best = min(score for var, score in scores)
+	return random.choice([var for var, score in scores if score == best])
+
+randomizedMethods = {
+	chooseFirstVariable: randomVariable,
+	orderValues: randomOrderValues,
+	minimumRemainingValuesHeuristic: randomMinimumRemainingValuesHeuristic,
+	leastConstrainingValuesHeuristic: randomLeastConstrainingValuesHeuristic,
+	domainOverWeightedDegree: randomDomainOverWeightedDegree,
+}
 
 
 """
@@ -410,24 +1047,30 @@ def noInferences(assignment, csp, var, value):
 """
 def forwardChecking(assignment, csp, var, value):
 	#print("invoked func")
-	inferences = set([])
-	for bc in [bc for bc in csp.binaryConstraints if bc.affects(var)]:
+	mark = len(assignment.trail)
+	for bc in csp.varConstraints[var]:
 		otherVar = bc.otherVariable(var)
-		for otherValue in [otherValue for otherValue in assignment.varDomains[otherVar] if not bc.isSatisfied(value, otherValue)]:
-				inferences.add((otherVar, otherValue))
-				assignment.varDomains[otherVar].remove(otherValue)
-				if len(assignment.varDomains[otherVar]) == 0:
-					for pair in inferences:
-						assignment.varDomains[pair[0]].add(pair[1])
+		for otherValue in bc.conflictingValues(var, value, assignment.varDomains[otherVar]):
+				if assignment.prune(otherVar, otherValue) == 0:
+					assignment.undo(mark)
+					assignment.bumpWeight(bc)
 					return None
-	return inferences
+	for constraint in csp.varAllDifferent[var]:
+		for otherVar in constraint.otherVariables(var):
+			if value in assignment.varDomains[otherVar] and assignment.prune(otherVar, value) == 0:
+				assignment.undo(mark)
+				assignment.bumpWeight(constraint)
+				return None
+	return assignment.inferencesSince(mark)
 
 """
 	Recursive backtracking algorithm.
 	A new assignment should not be created. The assignment passed in should have its domains updated with inferences.
 
 	In the case that a recursive call returns failure or a variable assignment is incorrect, the inferences made along
-	the way should be reversed. See maintainArcConsistency and forwardChecking for the format of inferences.
+	the way should be reversed. Each choice opens a decision level on the assignment trail, so the inferences are
+	reversed by popping the level rather than by replaying the returned set. Within the level the domain of the
+	assigned variable is reduced to the chosen value, so maintainArcConsistency revises arcs against that value alone.
 
 
 	Examples of the functions to be passed in:
@@ -455,153 +1098,1828 @@ def recursiveBacktrackingWithInferences(assignment, csp, orderValuesMethod, sele
 
 	var = selectVariableMethod(assignment, csp)
 	for value in orderValuesMethod(assignment, csp, var):
-		oldValue = assignment.assignedValues[var]
 		if consistent(assignment, csp, var, value):
-			assignment.assignedValues[var] = value
+			assignment.pushLevel()
+			assignment.assign(var, value)
+			for otherValue in [otherValue for otherValue in assignment.varDomains[var] if otherValue != value]:
+				assignment.prune(var, otherValue)
 			inferences = inferenceMethod(assignment, csp, var, value)
 			if inferences != None:
-		 		result = recursiveBacktracking(assignment, csp, orderValuesMethod, selectVariableMethod)
-		 		if not result == None:
-		 			return result
-		 		for pair in inferences:
-					assignment.varDomains[pair[0]].add(pair[1])
-		assignment.assignedValues[var] = None
+				result = recursiveBacktrackingWithInferences(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod)
+				if not result == None:
+					return result
+			assignment.popLevel()
+		assignment.unassign(var)
 
 	return None
 
 
+class SearchCutoff(Exception):
+	"""
+	Raised to stop a search early, e.g. from a node callback or a timer.
+	"""
+	pass
+
+
+class RunCutoff(SearchCutoff):
+	"""
+	Raised inside a run of restartingBacktracking that has used up its node limit. restartingBacktracking only
+	catches this subclass, so any other SearchCutoff still stops the whole search.
+	"""
+	pass
+
 
 """
-	Helper funciton to maintainArcConsistency and AC3.
-	Remove values from var2 domain if constraint cannot be satisfied.
-	Each inference should take the form of (variable, value) where the value is being removed from the
-	domain of variable. This format is important so that the inferences can be reversed if they
-	result in a conflicting partial assignment. If the algorithm reveals an inconsistency, any
-	inferences made should be reversed before ending the fuction.
+	Term i, counting from 1, of the Luby restart sequence 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8, ...
+"""
+def luby(i):
+	k = 1
+	while (1 << k) - 1 < i:
+		k += 1
+	if (1 << k) - 1 == i:
+		return 1 << (k - 1)
+	return luby(i - (1 << (k - 1)) + 1)
+
+
+class RestartRun:
+	"""
+	State of one run of restartingBacktracking.
+	decisions is the current branch as a list of [variable, value, refuted values] per level.
+	nogoods maps every (variable, value) pair to the recorded nogoods containing it and is shared by all runs.
 
 	Args:
-		assignment (Assignment): the partial assignment to expand
-		csp (ConstraintSatisfactionProblem): the problem description
-		var1 (string): the variable with consistent values
-		var2 (string): the variable that should have inconsistent values removed
-		constraint (BinaryConstraint): the constraint connecting var1 and var2
-	Returns:
-		set<tuple<variable, value>>
-		the inferences made in this call or None if inconsistent assignment
+		limit (int): the number of nodes after which the run is cut off
+		nogoods (dictionary<tuple<variable, value>, list<frozenset<tuple<variable, value>>>>): the nogoods so far
+	"""
+	def __init__(self, limit, nogoods):
+		self.limit = limit
+		self.nodes = 0
+		self.decisions = []
+		self.nogoods = nogoods
+
+	"""
+	Determines whether assigning value to var would complete a recorded nogood.
+	"""
+	def isNogood(self, assignment, var, value):
+		for nogood in self.nogoods.get((var, value), ()):
+			for otherVar, otherValue in nogood:
+				if otherVar != var and assignment.assignedValues[otherVar] != otherValue:
+					break
+			else:
+				return True
+		return False
+
+	"""
+	Records a nogood for every value refuted along the current branch: the decisions above its level
+	together with the refuted value. Returns the number of nogoods recorded.
+	"""
+	def recordNogoods(self):
+		count = 0
+		positive = []
+		for var, value, refuted in self.decisions:
+			for refutedValue in refuted:
+				nogood = frozenset(positive + [(var, refutedValue)])
+				for pair in nogood:
+					self.nogoods.setdefault(pair, []).append(nogood)
+				count += 1
+			positive.append((var, value))
+		return count
+
+
 """
-def revise(assignment, csp, var1, var2, constraint):
-	inferences = set([])
-	#print("revise called")
-	
-	for value2 in assignment.varDomains[var2]:
-		check = False
-		for value1 in assignment.varDomains[var1]:
-			if constraint.isSatisfied(value1, value2):
-				check = True
-		if check == False:
-			inferences.add((var2, value2))
-	
-	for i in inferences:
-		assignment.varDomains[i[0]].remove(i[1])
-
-	if len(assignment.varDomains[var2]) == 0:
-		for pair in inferences:
-			assignment.varDomains[pair[0]].add(pair[1])
-		return None
-	return inferences
+	One run of restartingBacktracking. Same as recursiveBacktrackingWithInferences, but skips values that
+	complete a recorded nogood, logs the branch on run.decisions and raises RunCutoff once run.limit
+	nodes have been expanded. The decision levels of a cut off run are left open for the caller to pop.
+"""
+def restartRunBacktracking(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod, run):
+	if assignment.isComplete():
+		return assignment
+
+	var = selectVariableMethod(assignment, csp)
+	decision = [var, None, []]
+	run.decisions.append(decision)
+	for value in orderValuesMethod(assignment, csp, var):
+		if consistent(assignment, csp, var, value) and not run.isNogood(assignment, var, value):
+			run.nodes += 1
+			if run.nodes > run.limit:
+				raise RunCutoff()
+			decision[1] = value
+			assignment.pushLevel()
+			assignment.assign(var, value)
+			for otherValue in [otherValue for otherValue in assignment.varDomains[var] if otherValue != value]:
+				assignment.prune(var, otherValue)
+			if inferenceMethod(assignment, csp, var, value) != None:
+				result = restartRunBacktracking(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod, run)
+				if result != None:
+					return result
+			assignment.popLevel()
+			assignment.unassign(var)
+			decision[2].append(value)
+	run.decisions.pop()
+	return None
+
 
 """
-	Implements the maintaining arc consistency algorithm.
-	Inferences take the form of (variable, value) where the value is being removed from the
-	domain of variable. This format is important so that the inferences can be reversed if they
-	result in a conflicting partial assignment. If the algorithm reveals an inconsistency, and
-	inferences made should be reversed before ending the fuction.
+	Backtracking search with restarts.
+	Run i is cut off after scale * luby(i) nodes and the search starts again from the given assignment.
+	Before restarting, every value refuted along the abandoned branch is recorded as a nogood with the
+	decisions above it, so later runs never explore those failures again. With randomize the heuristics
+	are replaced by their randomized counterparts so that every run explores a different part of the space.
 
 	Args:
-		assignment (Assignment): the partial assignment to expand
-		csp (ConstraintSatisfactionProblem): the problem description
-		var (string): the variable that has just been assigned a value
-		value (string): the value that has just been assigned
+		assignment (Assignment): a partial assignment to expand upon
+		csp (ConstraintSatisfactionProblem): the problem definition
+		orderValuesMethod (function<assignment, csp, variable> returns list<value>): a function to decide the next value to try
+		selectVariableMethod (function<assignment, csp> returns variable): a function to decide which variable to assign next
+		inferenceMethod (function<assignment, csp, variable, value> returns set<variable, value>): a function to specify what type of inferences to use
+		scale (int): the number of nodes per unit of the Luby sequence
+		maxRestarts (int): the number of restarts after which the run is no longer cut off, None for no bound
+		randomize (boolean): specifies whether to break heuristic ties at random or not
+		report (list<dictionary>): if given, one entry per run is appended with its restart number, node limit,
+				nodes expanded, nogoods recorded, time in seconds and status ('solved', 'unsatisfiable' or 'cutoff')
 	Returns:
-		set<<variable, value>>
-		the inferences made in this call or None if inconsistent assignment
+		Assignment
+		A completed and consistent assignment. None if no solution exists.
 """
-def maintainArcConsistency(assignment, csp, var, value):
-	inferences = set([])
-	"""Hint: implement revise first and use it as a helper function"""
-	"""Question 5"""
-	queue = []
-	for constraint in csp.binaryConstraints:
-		if constraint.affects(var):
-			queue.append(((constraint.otherVariable(var)), var, constraint))
-	
-	while len(queue) > 0:
-		(otherVar, var, constraint) = queue.pop(0)
-		otherInferences = revise(assignment, csp, var, otherVar, constraint)
-		if otherInferences == None:
-			for j in inferences:
-				assignment.varDomains[j[0]].add(j[1])
-			return None
-		if len(otherInferences) > 0:
-			inferences = inferences | otherInferences 
-			for newBc in [newBc for newBc in csp.binaryConstraints if (newBc.affects(otherVar)) & (newBc != constraint)]:
-				queue.append((newBc.otherVariable(otherVar), otherVar, newBc))
-	
-	return inferences
+def restartingBacktracking(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod=None, scale=100, maxRestarts=None, randomize=True, report=None):
+	if inferenceMethod is None:
+		inferenceMethod = noInferences
+	if randomize:
+		orderValuesMethod = randomizedMethods.get(orderValuesMethod, orderValuesMethod)
+		selectVariableMethod = randomizedMethods.get(selectVariableMethod, selectVariableMethod)
+	nogoods = {}
+	baseLevels = len(assignment.trailLevels)
+	restart = 0
+	while True:
+		limit = scale * luby(restart + 1)
+		if maxRestarts is not None and restart >= maxRestarts:
+			limit = float('inf')
+		run = RestartRun(limit, nogoods)
+		start = time.time()
+		recorded = 0
+		try:
+			result = restartRunBacktracking(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod, run)
+			status = 'unsatisfiable' if result is None else 'solved'
+		except RunCutoff:
+			result = None
+			status = 'cutoff'
+			recorded = run.recordNogoods()
+			while len(assignment.trailLevels) > baseLevels:
+				assignment.popLevel()
+			for var, value, refuted in run.decisions:
+				assignment.unassign(var)
+		if report is not None:
+			report.append({'restart': restart, 'limit': limit, 'nodes': run.nodes, 'nogoods': recorded, \
+				'time': time.time() - start, 'status': status})
+		if status != 'cutoff':
+			return result
+		restart += 1
 
 
 """
-	AC3 algorithm for constraint propogation. Used as a preprocessing step to reduce the problem
-	before running recursive backtracking.
+	Finds the assigned neighbour of var that rules out value and was assigned earliest.
 
 	Args:
-		assignment (Assignment): the partial assignment to expand
-		csp (ConstraintSatisfactionProblem): the problem description
+		order (dictionary<variable, int>): the depth at which each variable was assigned by the search
 	Returns:
-		Assignment
-		the updated assignment after inferences are made or None if an inconsistent assignment
+		variable
+		the culprit, None if no assigned neighbour conflicts with value. Variables assigned before the search
+		started come before every search decision.
 """
-def AC3(assignment, csp):
-	inferences = set([])
-	"""Hint: implement revise first and use it as a helper function"""
-	"""Question 6"""
-	for variable in assignment.varDomains.keys():
-		for value in assignment.varDomains[variable]:
-			inferences = maintainArcConsistency(assignment, csp, variable, value)
-			if inferences == None:
-				return None
-	return assignment
+def earliestConflict(assignment, csp, var, value, order):
+	culprit = None
+	culpritDepth = None
+	for bc in csp.varConstraints[var]:
+		otherVar = bc.otherVariable(var)
+		if assignment.isAssigned(otherVar) and not bc.isSatisfied(value, assignment.assignedValues[otherVar]):
+			depth = order.get(otherVar, -1)
+			if culprit is None or depth < culpritDepth:
+				culprit = otherVar
+				culpritDepth = depth
+	for constraint in csp.varAllDifferent[var]:
+		for otherVar in constraint.otherVariables(var):
+			if assignment.assignedValues[otherVar] == value:
+				depth = order.get(otherVar, -1)
+				if culprit is None or depth < culpritDepth:
+					culprit = otherVar
+					culpritDepth = depth
+	return culprit
 
 
 """
-	Solves a binary constraint satisfaction problem.
+	Explains why values are missing from the domain of var: for every value pruned since the search
+	started, the earliest search decision that conflicts with it. A value with no such decision was removed
+	by a chain of propagation, so every search decision is blamed.
 
-	Args:
-		csp (ConstraintSatisfactionProblem): a CSP to be solved
-		orderValuesMethod (function): a function to decide the next value to try
-		selectVariableMethod (function): a function to decide which variable to assign next
-		inferenceMethod (function): a function to specify what type of inferences to use
-		useAC3 (boolean): specifies whether to use the AC3 preprocessing step or not
 	Returns:
-		dictionary<string, value>
-		A map from variables to their assigned values. None if no solution exists.
+		set<variable>
+		the search decisions responsible for the pruning of var
 """
-def solve(csp, orderValuesMethod=leastConstrainingValuesHeuristic, selectVariableMethod=minimumRemainingValuesHeuristic, inferenceMethod=None, useAC3=True):
-	assignment = Assignment(csp)
+def explainPruning(assignment, csp, var, initialDomains, order):
+	culprits = set()
+	for value in initialDomains[var] - assignment.varDomains[var]:
+		culprit = earliestConflict(assignment, csp, var, value, order)
+		if culprit is None:
+			return set(order)
+		if culprit in order:
+			culprits.add(culprit)
+	return culprits
 
-	assignment = eliminateUnaryConstraints(assignment, csp)
-	if assignment == None:
-		return assignment
 
-	if useAC3:
-		assignment = AC3(assignment, csp)
-		if assignment == None:
-			return assignment
-	if inferenceMethod is None or inferenceMethod==noInferences:
-		assignment = recursiveBacktracking(assignment, csp, orderValuesMethod, selectVariableMethod)
+"""
+	Explains a wipeout caused by assigning value to var: the neighbour left with no value compatible
+	with it, and the decisions that pruned that neighbour. When no single neighbour was wiped out directly
+	(maintainArcConsistency chains), every search decision is blamed.
+"""
+def explainWipeout(assignment, csp, var, value, initialDomains, order):
+	for bc in csp.varConstraints[var]:
+		otherVar = bc.otherVariable(var)
+		if not assignment.isAssigned(otherVar):
+			domain = assignment.varDomains[otherVar]
+			if len(bc.conflictingValues(var, value, domain)) == len(domain):
+				return explainPruning(assignment, csp, otherVar, initialDomains, order)
+	for constraint in csp.varAllDifferent[var]:
+		for otherVar in constraint.otherVariables(var):
+			if not assignment.isAssigned(otherVar) and assignment.varDomains[otherVar] == set([value]):
+				return explainPruning(assignment, csp, otherVar, initialDomains, order)
+	return set(order)
+
+
+"""
+	Recursive step of conflictDirectedBackjumping.
+
+	Returns:
+		tuple<Assignment, set<variable>>
+		the completed assignment and None, or None and the conflict set of the failed subtree
+"""
+def backjumpingSearch(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod, initialDomains, order):
+	if assignment.isComplete():
+		return assignment, None
+
+	var = selectVariableMethod(assignment, csp)
+	conflictSet = explainPruning(assignment, csp, var, initialDomains, order)
+	for value in orderValuesMethod(assignment, csp, var):
+		culprit = earliestConflict(assignment, csp, var, value, order)
+		if culprit is not None:
+			if culprit in order:
+				conflictSet.add(culprit)
+			continue
+		assignment.pushLevel()
+		assignment.assign(var, value)
+		order[var] = len(order)
+		for otherValue in [otherValue for otherValue in assignment.varDomains[var] if otherValue != value]:
+			assignment.prune(var, otherValue)
+		if inferenceMethod(assignment, csp, var, value) == None:
+			assignment.popLevel()
+			conflictSet |= explainWipeout(assignment, csp, var, value, initialDomains, order)
+		else:
+			result, childConflicts = backjumpingSearch(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod, initialDomains, order)
+			if result != None:
+				return result, None
+			assignment.popLevel()
+			if var not in childConflicts:
+				assignment.unassign(var)
+				del order[var]
+				return None, childConflicts
+			conflictSet |= childConflicts
+		assignment.unassign(var)
+		del order[var]
+		conflictSet.discard(var)
+	return None, conflictSet
+
+
+"""
+	Conflict-directed backjumping.
+	Every variable collects a conflict set: the earlier decisions whose constraints ruled out its values,
+	either directly in consistent or through the pruning of forwardChecking and maintainArcConsistency.
+	When every value of a variable has failed, the search jumps straight back to the most recent variable in
+	its conflict set, which inherits the rest of the set, instead of retrying each level in between.
+	Takes the same arguments as recursiveBacktrackingWithInferences.
+
+	Args:
+		assignment (Assignment): a partial assignment to expand upon
+		csp (ConstraintSatisfactionProblem): the problem definition
+		orderValuesMethod (function<assignment, csp, variable> returns list<value>): a function to decide the next value to try
+		selectVariableMethod (function<assignment, csp> returns variable): a function to decide which variable to assign next
+		inferenceMethod (function<assignment, csp, variable, value> returns set<variable, value>): a function to specify what type of inferences to use
+	Returns:
+		Assignment
+		A completed and consistent assignment. None if no solution exists.
+"""
+def conflictDirectedBackjumping(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod):
+	if inferenceMethod is None:
+		inferenceMethod = noInferences
+	initialDomains = dict((var, set(domain)) for var, domain in assignment.varDomains.iteritems())
+	result, conflictSet = backjumpingSearch(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod, initialDomains, {})
+	return result
+
+
+class ArcConsistencyEngine:
+	"""
+	Arc consistency propagation shared by revise, maintainArcConsistency and AC3.
+	Pending arcs are kept in a deque with a set beside it, so popping is O(1) and an arc that is already
+	waiting is never queued twice. An arc is a tuple (var2, var1, constraint) meaning var2 is revised against var1.
+
+	For every arc the engine remembers the last value of var1 found to support each value of var2. Domains
+	are unordered sets, so instead of resuming a scan (AC-2001) revise first checks whether that residual
+	support is still in the domain and only rescans the domain of var1 when it is gone.
+	A TableConstraint is revised by intersecting the support set of each value with the domain instead.
+	AllDifferentConstraints wait in a second queue and are filtered as a whole once no arc is pending.
+
+	Counts the revisions made and the values pruned in revisions and prunedValues.
+	"""
+	def __init__(self):
+		self.residues = {}
+		self.revisions = 0
+		self.prunedValues = 0
+
+	"""
+	Removes the values of var2 that have no support in var1 under constraint.
+
+	Returns:
+		boolean
+		False if the domain of var2 was wiped out, True otherwise. Pruned values stay on the trail either way.
+	"""
+	def revise(self, assignment, var1, var2, constraint):
+		self.revisions += 1
+		if isinstance(constraint, TableConstraint):
+			return self.reviseTable(assignment, var1, var2, constraint)
+		domain1 = assignment.varDomains[var1]
+		domain2 = assignment.varDomains[var2]
+		residues = self.residues.get((var2, constraint))
+		if residues is None:
+			residues = self.residues[(var2, constraint)] = {}
+		unsupported = []
+		for value2 in domain2:
+			support = residues.get(value2)
+			if support is not None and support in domain1:
+				continue
+			for value1 in domain1:
+				if constraint.isSatisfied(value1, value2):
+					residues[value2] = value1
+					break
+			else:
+				unsupported.append(value2)
+		for value2 in unsupported:
+			assignment.prune(var2, value2)
+		self.prunedValues += len(unsupported)
+		if not domain2:
+			assignment.bumpWeight(constraint)
+			return False
+		return True
+
+	def reviseTable(self, assignment, var1, var2, constraint):
+		domain1 = assignment.varDomains[var1]
+		domain2 = assignment.varDomains[var2]
+		supports = constraint.supports[var2]
+		unsupported = []
+		for value2 in domain2:
+			if value2 in supports:
+				if supports[value2].isdisjoint(domain1):
+					unsupported.append(value2)
+			elif not any(constraint.constraint.isSatisfied(value1, value2) for value1 in domain1):
+				unsupported.append(value2)
+		for value2 in unsupported:
+			assignment.prune(var2, value2)
+		self.prunedValues += len(unsupported)
+		if not domain2:
+			assignment.bumpWeight(constraint)
+			return False
+		return True
+
+	"""
+	Removes the values of the variables of an AllDifferentConstraint that belong to no assignment of distinct values.
+
+	Returns:
+		set<variable>
+		the variables whose domains shrank, or None if the variables cannot all take different values
+	"""
+	def filterAllDifferent(self, assignment, constraint):
+		self.revisions += 1
+		domains = {}
+		for var in constraint.variables:
+			if assignment.isAssigned(var):
+				domains[var] = (assignment.assignedValues[var],)
+			else:
+				domains[var] = assignment.varDomains[var]
+		unsupported = constraint.unsupportedValues(domains)
+		if unsupported is None:
+			assignment.bumpWeight(constraint)
+			return None
+		for var, value in unsupported:
+			assignment.prune(var, value)
+		self.prunedValues += len(unsupported)
+		return set(var for var, value in unsupported)
+
+	"""
+	Revises arcs from queue until it is empty, queueing the arcs into every variable whose domain shrinks.
+	The AllDifferentConstraints of that variable are queued in groups and filtered once queue is empty.
+
+	Args:
+		assignment (Assignment): the partial assignment to make arc consistent
+		csp (ConstraintSatisfactionProblem): the problem description
+		queue (deque<tuple<variable, variable, BinaryConstraint>>): the arcs to start from
+		groups (iterable<AllDifferentConstraint>): the AllDifferentConstraints to start from
+	Returns:
+		boolean
+		False if a domain was wiped out, True otherwise
+	"""
+	def propagate(self, assignment, csp, queue, groups=()):
+		varDomains = assignment.varDomains
+		pending = set(queue)
+		groups = deque(groups)
+		pendingGroups = set(groups)
+		def shrunk(var, constraint):
+			for newBc in csp.varConstraints[var]:
+				if newBc is not constraint:
+					newArc = (newBc.otherVariable(var), var, newBc)
+					if newArc not in pending:
+						pending.add(newArc)
+						queue.append(newArc)
+			for group in csp.varAllDifferent[var]:
+				if group is not constraint and group not in pendingGroups:
+					pendingGroups.add(group)
+					groups.append(group)
+		while queue or groups:
+			if not queue:
+				constraint = groups.popleft()
+				pendingGroups.discard(constraint)
+				changed = self.filterAllDifferent(assignment, constraint)
+				if changed is None:
+					return False
+				for var in changed:
+					shrunk(var, constraint)
+				continue
+			arc = queue.popleft()
+			pending.discard(arc)
+			otherVar, var, constraint = arc
+			before = len(varDomains[otherVar])
+			if not self.revise(assignment, var, otherVar, constraint):
+				return False
+			if len(varDomains[otherVar]) < before:
+				shrunk(otherVar, constraint)
+		return True
+
+
+"""
+	Helper funciton to maintainArcConsistency and AC3.
+	Remove values from var2 domain if constraint cannot be satisfied.
+	Each inference should take the form of (variable, value) where the value is being removed from the
+	domain of variable. This format is important so that the inferences can be reversed if they
+	result in a conflicting partial assignment. If the algorithm reveals an inconsistency, any
+	inferences made should be reversed before ending the fuction.
+
+	Args:
+		assignment (Assignment): the partial assignment to expand
+		csp (ConstraintSatisfactionProblem): the problem description
+		var1 (string): the variable with consistent values
+		var2 (string): the variable that should have inconsistent values removed
+		constraint (BinaryConstraint): the constraint connecting var1 and var2
+	Returns:
+		set<tuple<variable, value>>
+		the inferences made in this call or None if inconsistent assignment
+"""
+def revise(assignment, csp, var1, var2, constraint):
+	#print("revise called")
+	mark = len(assignment.trail)
+	if not csp.arcConsistency.revise(assignment, var1, var2, constraint):
+		assignment.undo(mark)
+		return None
+	return assignment.inferencesSince(mark)
+
+"""
+	Gets the arcs revising every neighbour of var against var, as a queue for ArcConsistencyEngine.propagate.
+"""
+def neighbourArcs(csp, var):
+	return deque((constraint.otherVariable(var), var, constraint) for constraint in csp.varConstraints[var])
+
+
+"""
+	Implements the maintaining arc consistency algorithm.
+	Inferences take the form of (variable, value) where the value is being removed from the
+	domain of variable. This format is important so that the inferences can be reversed if they
+	result in a conflicting partial assignment. If the algorithm reveals an inconsistency, and
+	inferences made should be reversed before ending the fuction.
+
+	Args:
+		assignment (Assignment): the partial assignment to expand
+		csp (ConstraintSatisfactionProblem): the problem description
+		var (string): the variable that has just been assigned a value
+		value (string): the value that has just been assigned
+	Returns:
+		set<<variable, value>>
+		the inferences made in this call or None if inconsistent assignment
+"""
+def maintainArcConsistency(assignment, csp, var, value):
+	"""Hint: implement revise first and use it as a helper function"""
+	"""Question 5"""
+	mark = len(assignment.trail)
+	if not csp.arcConsistency.propagate(assignment, csp, neighbourArcs(csp, var), csp.varAllDifferent[var]):
+		assignment.undo(mark)
+		return None
+	return assignment.inferencesSince(mark)
+
+
+"""
+	AC3 algorithm for constraint propogation. Used as a preprocessing step to reduce the problem
+	before running recursive backtracking. The queue is seeded once with both arcs of every constraint
+	and every AllDifferentConstraint.
+
+	Args:
+		assignment (Assignment): the partial assignment to expand
+		csp (ConstraintSatisfactionProblem): the problem description
+	Returns:
+		Assignment
+		the updated assignment after inferences are made or None if an inconsistent assignment
+"""
+def AC3(assignment, csp):
+	"""Hint: implement revise first and use it as a helper function"""
+	"""Question 6"""
+	queue = deque()
+	for constraint in csp.binaryConstraints:
+		queue.append((constraint.var2, constraint.var1, constraint))
+		queue.append((constraint.var1, constraint.var2, constraint))
+	if not csp.arcConsistency.propagate(assignment, csp, queue, csp.allDifferentConstraints):
+		return None
+	return assignment
+
+
+"""
+	Singleton arc consistency, a stronger preprocessing step than AC3 for before the search.
+	Each value is tried in turn by reducing the domain of its variable to that value inside a decision level and
+	propagating arc consistency from it. Values whose trial wipes out a domain are removed for good and their
+	consequences propagated, and the passes repeat until one removes nothing. Assumes the assignment is already
+	arc consistent, e.g. after AC3.
+
+	Args:
+		assignment (Assignment): the partial assignment to reduce
+		csp (ConstraintSatisfactionProblem): the problem description
+		budget (float): seconds after which the values not tried yet are kept, None for no limit
+	Returns:
+		Assignment
+		the updated assignment, or None if a domain was wiped out
+"""
+def singletonArcConsistency(assignment, csp, budget=None):
+	deadline = None if budget is None else time.time() + budget
+	engine = csp.arcConsistency
+	domains = assignment.varDomains
+	changed = True
+	while changed:
+		changed = False
+		for var in csp.varDomains:
+			if assignment.isAssigned(var) or len(domains[var]) < 2:
+				continue
+			for value in list(domains[var]):
+				if deadline is not None and time.time() > deadline:
+					return assignment
+				if value not in domains[var]:
+					continue
+				assignment.pushLevel()
+				for otherValue in [otherValue for otherValue in domains[var] if otherValue != value]:
+					assignment.prune(var, otherValue)
+				supported = engine.propagate(assignment, csp, neighbourArcs(csp, var), csp.varAllDifferent[var])
+				assignment.popLevel()
+				if not supported:
+					changed = True
+					if assignment.prune(var, value) == 0:
+						return None
+					if not engine.propagate(assignment, csp, neighbourArcs(csp, var), csp.varAllDifferent[var]):
+						return None
+	return assignment
+
+
+"""
+	Restricted path consistency, a cheaper preprocessing step than singletonArcConsistency.
+	On top of arc consistency, a value of x with a single support b in a neighbour y is removed if some variable z
+	constrained with both x and y has no value compatible with the value and b at once, since then no solution
+	uses the value. Passes repeat until one removes nothing. Only binary constraints are considered.
+
+	Args:
+		assignment (Assignment): the partial assignment to reduce
+		csp (ConstraintSatisfactionProblem): the problem description
+		budget (float): seconds after which the values not checked yet are kept, None for no limit
+	Returns:
+		Assignment
+		the updated assignment, or None if a domain was wiped out
+"""
+def restrictedPathConsistency(assignment, csp, budget=None):
+	deadline = None if budget is None else time.time() + budget
+	engine = csp.arcConsistency
+	domains = assignment.varDomains
+	pairConstraints = {}
+	for bc in csp.binaryConstraints:
+		pairConstraints.setdefault((bc.var1, bc.var2), []).append(bc)
+		pairConstraints.setdefault((bc.var2, bc.var1), []).append(bc)
+	pairNeighbours = {}
+	for var, otherVar in pairConstraints:
+		pairNeighbours.setdefault(var, set()).add(otherVar)
+	def compatible(var, value, otherVar, otherValue):
+		return all(bc.isSatisfied(value, otherValue) for bc in pairConstraints[(var, otherVar)])
+
+	changed = True
+	while changed:
+		changed = False
+		for var in csp.varDomains:
+			if assignment.isAssigned(var):
+				continue
+			neighbours = pairNeighbours.get(var, ())
+			for value in list(domains[var]):
+				if deadline is not None and time.time() > deadline:
+					return assignment
+				if value not in domains[var]:
+					continue
+				for otherVar in neighbours:
+					supports = [otherValue for otherValue in domains[otherVar] if compatible(var, value, otherVar, otherValue)]
+					if len(supports) == 1:
+						witnessVars = [thirdVar for thirdVar in neighbours if thirdVar != otherVar and (otherVar, thirdVar) in pairConstraints]
+						if not all(any(compatible(var, value, thirdVar, thirdValue) and compatible(otherVar, supports[0], thirdVar, thirdValue) \
+								for thirdValue in domains[thirdVar]) for thirdVar in witnessVars):
+							supports = []
+					if not supports:
+						changed = True
+						if assignment.prune(var, value) == 0:
+							return None
+						if not engine.propagate(assignment, csp, neighbourArcs(csp, var), csp.varAllDifferent[var]):
+							return None
+						break
+	return assignment
+
+
+"""
+	Finds a small cycle cutset of a problem: variables whose removal leaves the constraint graph of the other
+	variables a forest. Variables that are assigned or have a single value left cost nothing to condition on and are
+	always removed first. After that the variable with the most neighbours left is removed until only a forest remains,
+	which shows once stripping every variable with at most one neighbour left empties the graph.
+
+	Args:
+		assignment (Assignment): the partial assignment
+		csp (ConstraintSatisfactionProblem): the problem definition
+		maxSize (int): the most variables with several values the cutset may have
+	Returns:
+		list<string>
+		the cutset, with the variables that cost nothing first. None if it would need more than maxSize variables.
+"""
+def cycleCutset(assignment, csp, maxSize):
+	neighbours = dict((var, set(csp.varNeighbours[var])) for var in csp.varDomains)
+	def remove(var):
+		for neighbour in neighbours.pop(var):
+			neighbours[neighbour].discard(var)
+	cutset = [var for var in csp.varDomains if assignment.isAssigned(var) or len(assignment.varDomains[var]) == 1]
+	for var in cutset:
+		remove(var)
+	size = 0
+	while True:
+		leaves = [var for var in neighbours if len(neighbours[var]) <= 1]
+		while leaves:
+			var = leaves.pop()
+			if var in neighbours:
+				leaves.extend(neighbour for neighbour in neighbours[var] if len(neighbours[neighbour]) == 2)
+				remove(var)
+		if not neighbours:
+			return cutset
+		if size == maxSize:
+			return None
+		var = max(neighbours, key=lambda var: len(neighbours[var]))
+		cutset.append(var)
+		remove(var)
+		size += 1
+
+
+"""
+	Solves the unassigned variables of a problem when their constraint graph is a forest, in time linear in the number
+	of variables. Every tree is rooted at the variable selectVariableMethod picks and ordered breadth first. Values
+	that conflict with an assigned variable are removed first. Revising each parent against its child from the last
+	variable up then makes the tree directionally arc consistent, after which every variable in order has a value
+	consistent with its parent and the assignment never has to backtrack.
+	Values are tried in the order of orderValuesMethod and inferenceMethod runs after every assignment as in
+	recursiveBacktrackingWithInferences.
+
+	Args:
+		assignment (Assignment): a partial assignment to expand upon
+		csp (ConstraintSatisfactionProblem): the problem definition
+		orderValuesMethod (function<assignment, csp, variable> returns list<value>): a function to decide the next value to try
+		selectVariableMethod (function<assignment, csp> returns variable): a function to pick the root of every tree
+		inferenceMethod (function<assignment, csp, variable, value> returns set<variable, value>): a function to specify what type of inferences to use
+	Returns:
+		Assignment
+		A completed and consistent assignment. None if no solution exists, with the assignment as it was passed in.
+"""
+def treeSearch(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod=None):
+	if inferenceMethod is None:
+		inferenceMethod = noInferences
+	domains = assignment.varDomains
+	assigned = []
+	assignment.pushLevel()
+	while not assignment.isComplete():
+		root = selectVariableMethod(assignment, csp)
+		order = [root]
+		parents = {root: None}
+		for var in order:
+			for neighbour in csp.varNeighbours[var]:
+				if neighbour not in parents and not assignment.isAssigned(neighbour):
+					parents[neighbour] = var
+					order.append(neighbour)
+
+		supported = True
+		for var in order:
+			for value in [value for value in domains[var] if not consistent(assignment, csp, var, value)]:
+				assignment.prune(var, value)
+			if not domains[var]:
+				supported = False
+				break
+
+		for var in reversed(order[1:]) if supported else ():
+			parent = parents[var]
+			constraints = [bc for bc in csp.varConstraints[var] if bc.otherVariable(var) == parent]
+			if len(constraints) == 1:
+				supported = csp.arcConsistency.revise(assignment, var, parent, constraints[0])
+			else:
+				# Parallel constraints are revised as one, or a value could keep a different support for each.
+				for value in [value for value in domains[parent] if not any(all(bc.isSatisfied(value, childValue) \
+						for bc in constraints) for childValue in domains[var])]:
+					assignment.prune(parent, value)
+				supported = len(domains[parent]) > 0
+			if not supported:
+				break
+
+		for var in order if supported else ():
+			value = next((value for value in orderValuesMethod(assignment, csp, var) if consistent(assignment, csp, var, value)), None)
+			if value is None:
+				supported = False
+				break
+			assignment.assign(var, value)
+			assigned.append(var)
+			for otherValue in [otherValue for otherValue in domains[var] if otherValue != value]:
+				assignment.prune(var, otherValue)
+			if inferenceMethod(assignment, csp, var, value) == None:
+				supported = False
+				break
+
+		if not supported:
+			assignment.popLevel()
+			for var in assigned:
+				assignment.unassign(var)
+			return None
+	assignment.commitLevel()
+	return assignment
+
+
+"""
+	Checks whether the constraint graph of the unassigned variables of a problem is a forest.
+
+	Args:
+		assignment (Assignment): the partial assignment
+		csp (ConstraintSatisfactionProblem): the problem definition
+	Returns:
+		boolean
+		True if no cycle joins unassigned variables
+"""
+def isForest(assignment, csp):
+	parents = {}
+	def find(var):
+		while parents.get(var, var) != var:
+			var = parents[var]
+		return var
+	for var in csp.varDomains:
+		if assignment.isAssigned(var):
+			continue
+		for neighbour in csp.varNeighbours[var]:
+			if neighbour < var and not assignment.isAssigned(neighbour):
+				root, otherRoot = find(var), find(neighbour)
+				if root == otherRoot:
+					return False
+				parents[root] = otherRoot
+	return True
+
+
+"""
+	Cycle cutset conditioning. Backtracks like recursiveBacktrackingWithInferences, with the variables picked by
+	selectVariableMethod and inferenceMethod after every assignment, until the unassigned variables form a forest,
+	and solves that forest with treeSearch. The forest is there at the latest once every variable of a cycle cutset
+	is assigned, so with a cutset of c variables of at most d values and an ordering that picks them first the
+	search costs O(d ** c) forest solves, and a tree-structured problem is solved without backtracking at all.
+
+	Args:
+		assignment (Assignment): a partial assignment to expand upon
+		csp (ConstraintSatisfactionProblem): the problem definition
+		orderValuesMethod (function<assignment, csp, variable> returns list<value>): a function to decide the next value to try
+		selectVariableMethod (function<assignment, csp> returns variable): a function to decide which variable to assign
+				next, and to pick the root of every tree
+		inferenceMethod (function<assignment, csp, variable, value> returns set<variable, value>): a function to specify what type of inferences to use
+	Returns:
+		Assignment
+		A completed and consistent assignment. None if no solution exists.
+"""
+def cutsetConditioning(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod=None):
+	if inferenceMethod is None:
+		inferenceMethod = noInferences
+	if isForest(assignment, csp):
+		return treeSearch(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod)
+
+	var = selectVariableMethod(assignment, csp)
+	for value in orderValuesMethod(assignment, csp, var):
+		if consistent(assignment, csp, var, value):
+			assignment.pushLevel()
+			assignment.assign(var, value)
+			for otherValue in [otherValue for otherValue in assignment.varDomains[var] if otherValue != value]:
+				assignment.prune(var, otherValue)
+			if inferenceMethod(assignment, csp, var, value) != None:
+				result = cutsetConditioning(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod)
+				if not result == None:
+					return result
+			assignment.popLevel()
+		assignment.unassign(var)
+	return None
+
+
+tableCache = None
+tableCacheLimit = 100000
+
+"""
+	Compiles every binary constraint of a problem into a TableConstraint for the current domains.
+	While tableCache is a dictionary, tables are looked up in it by the class, attributes and domains of their
+	constraint first, so problems that share their structure only build each table once (see solveBatch).
+
+	Args:
+		csp (ConstraintSatisfactionProblem): the problem to compile
+		assignment (Assignment): optional assignment whose domains are used instead of the csp domains
+	Returns:
+		ConstraintSatisfactionProblem
+		a problem with the same variables, domains, AllDifferentConstraints and unary constraints whose binary
+		constraints are tables
+"""
+def compileTables(csp, assignment=None):
+	varDomains = csp.varDomains if assignment is None else assignment.varDomains
+	variables = list(csp.varDomains)
+	if tableCache is None:
+		tables = [TableConstraint(c, varDomains[c.var1], varDomains[c.var2]) for c in csp.binaryConstraints]
+	else:
+		if len(tableCache) > tableCacheLimit:
+			tableCache.clear()
+		tables = []
+		for c in csp.binaryConstraints:
+			key = (c.__class__, tuple(sorted(c.__dict__.items())), frozenset(varDomains[c.var1]), frozenset(varDomains[c.var2]))
+			if key not in tableCache:
+				tableCache[key] = TableConstraint(c, varDomains[c.var1], varDomains[c.var2])
+			tables.append(tableCache[key])
+	return ConstraintSatisfactionProblem(variables, [csp.varDomains[var] for var in variables], \
+		tables + csp.allDifferentConstraints, csp.unaryConstraints)
+
+
+"""
+	Wraps an inference method so that the values it prunes are added to stats under its name.
+"""
+def countingInference(inferenceMethod, stats):
+	name = getattr(inferenceMethod, '__name__', str(inferenceMethod))
+	def inference(assignment, csp, var, value):
+		mark = len(assignment.trail)
+		inferences = inferenceMethod(assignment, csp, var, value)
+		if inferences != None:
+			stats.addPruned(name, len(assignment.trail) - mark)
+		return inferences
+	return inference
+
+
+"""
+	Finds the connected components of the constraint graph of a problem.
+
+	Args:
+		csp (ConstraintSatisfactionProblem): the problem definition
+	Returns:
+		list<list<string>>
+		the variables of every component
+"""
+def connectedComponents(csp):
+	seen = set()
+	components = []
+	for root in csp.varDomains:
+		if root in seen:
+			continue
+		seen.add(root)
+		component = [root]
+		stack = [root]
+		while stack:
+			for neighbour in csp.varNeighbours[stack.pop()]:
+				if neighbour not in seen:
+					seen.add(neighbour)
+					component.append(neighbour)
+					stack.append(neighbour)
+		components.append(component)
+	return components
+
+
+"""
+	Builds the problem over some of the variables of a problem with the constraints among them.
+	The variables must be a union of connected components so that no constraint is cut. The new problem shares
+	the ArcConsistencyEngine of the whole, as its residues are kept per variable and constraint.
+
+	Args:
+		csp (ConstraintSatisfactionProblem): the whole problem
+		variables (list<string>): the variables to keep
+	Returns:
+		ConstraintSatisfactionProblem
+		the problem restricted to variables
+"""
+def componentProblem(csp, variables):
+	binaryConstraints = [c for var in variables for c in csp.varConstraints[var] if c.var1 == var]
+	binaryConstraints.extend(c for var in variables for c in csp.varAllDifferent[var] if c.variables[0] == var)
+	unaryConstraints = [c for var in variables for c in csp.varUnaryConstraints[var]]
+	component = ConstraintSatisfactionProblem(variables, [csp.varDomains[var] for var in variables], binaryConstraints, unaryConstraints)
+	component.arcConsistency = csp.arcConsistency
+	return component
+
+
+def componentWorker(job):
+	index, csp, config, record, options = job
+	stats = SearchStats()
+	solution = solveRecording(csp, *(config + (stats, record) + options))
+	return index, solution, stats
+
+
+"""
+	Solves the connected components of a problem one by one, or on a pool of worker processes, and merges
+	their solutions. The components share no constraint, so the problem has a solution exactly when each of
+	them has one, and the first component found unsatisfiable ends the solve. Search then costs the sum of the
+	costs of the components rather than their product, as a failure in one never makes the search go back over
+	the others.
+
+	Args:
+		csp (ConstraintSatisfactionProblem): a CSP to be solved
+		components (list<list<string>>): its connected components, as given by connectedComponents
+		config (tuple): the arguments of solveRecording from orderValuesMethod to searchMethod
+		stats (SearchStats): the statistics of the whole solve, to which every component adds its own
+		record (boolean): specifies whether the search reports to stats or not
+		options (tuple): the arguments of solveRecording after record
+		workers (int): number of worker processes, 0 solves the components in this process
+	Returns:
+		dictionary<string, value>
+		A map from variables to their assigned values. None if no solution exists.
+"""
+def solveComponents(csp, components, config, stats, record, options, workers=0):
+	solution = {}
+	if workers == 0:
+		for component in components:
+			partial = solveRecording(componentProblem(csp, component), *(config + (stats, record) + options))
+			if partial is None:
+				return None
+			solution.update(partial)
+		return solution
+
+	jobs = [(i, componentProblem(csp, component), config, record, options) \
+		for i, component in enumerate(components)]
+	pool = multiprocessing.Pool(min(workers, len(jobs)))
+	try:
+		for index, partial, componentStats in pool.imap_unordered(componentWorker, jobs):
+			stats.merge(componentStats)
+			if partial is None:
+				return None
+			solution.update(partial)
+	finally:
+		pool.terminate()
+		pool.join()
+		stats.endPhase('components')
+	return solution
+
+
+"""
+	Solves a binary constraint satisfaction problem.
+
+	Args:
+		csp (ConstraintSatisfactionProblem): a CSP to be solved
+		orderValuesMethod (function): a function to decide the next value to try
+		selectVariableMethod (function): a function to decide which variable to assign next
+		inferenceMethod (function): a function to specify what type of inferences to use
+		useAC3 (boolean): specifies whether to use the AC3 preprocessing step or not
+		compiled (boolean): specifies whether to search on the integer-indexed CompiledCSP form or not
+		useTables (boolean): specifies whether to compile the binary constraints into TableConstraints after
+				unary constraints are eliminated or not
+		searchMethod (function): the search to run, with the arguments of recursiveBacktrackingWithInferences
+				(e.g. conflictDirectedBackjumping or restartingBacktracking). None picks recursiveBacktracking or
+				recursiveBacktrackingWithInferences from inferenceMethod.
+		preprocessMethod (function<assignment, csp, budget> returns Assignment): a stronger preprocessing step run
+				after AC3 (e.g. singletonArcConsistency or restrictedPathConsistency), None for none. Not used by
+				the compiled search.
+		preprocessBudget (float): seconds the preprocessing step may take, None for no limit
+		returnStats (boolean): specifies whether to return the SearchStats of the solve along with the solution or not.
+				The compiled search only records the phase times.
+		nodeCallback (function<assignment, variable, value>): called at every node of the search. When components are
+				solved separately it is given the assignment of the component being searched.
+		decompose (boolean): specifies whether to solve the connected components of the constraint graph separately
+				or not. Only the problem as a whole has to be searched when it is connected.
+		decomposeWorkers (int): number of worker processes solving components at once, 0 solves them in this
+				process. The nodeCallback is not called in worker processes.
+		maxCutsetSize (int): when no searchMethod is given and the problem has no AllDifferentConstraints, problems
+				with a cycle cutset of at most this many variables are solved by cutsetConditioning instead, and
+				tree-structured ones by treeSearch alone. None always uses backtracking.
+	Returns:
+		dictionary<string, value>
+		A map from variables to their assigned values. None if no solution exists.
+		With returnStats, a tuple of that map and the SearchStats.
+"""
+def solve(csp, orderValuesMethod=leastConstrainingValuesHeuristic, selectVariableMethod=minimumRemainingValuesHeuristic, inferenceMethod=None, useAC3=True, compiled=False, useTables=False, searchMethod=None, returnStats=False, nodeCallback=None, preprocessMethod=None, preprocessBudget=None, decompose=True, decomposeWorkers=0, maxCutsetSize=2):
+	stats = SearchStats(nodeCallback)
+	record = returnStats or nodeCallback is not None
+	config = (orderValuesMethod, selectVariableMethod, inferenceMethod, useAC3, compiled, useTables, searchMethod)
+	options = (preprocessMethod, preprocessBudget, maxCutsetSize)
+	components = connectedComponents(csp) if decompose else None
+	if components is None or len(components) < 2:
+		solution = solveRecording(csp, *(config + (stats, record) + options))
+	else:
+		solution = solveComponents(csp, components, config, stats, record, options, decomposeWorkers)
+	if returnStats:
+		return solution, stats
+	return solution
+
+
+"""
+	Body of solve. The phases are always timed in stats; the search only reports to it when record is True.
+"""
+def solveRecording(csp, orderValuesMethod, selectVariableMethod, inferenceMethod, useAC3, compiled, useTables, searchMethod, stats, record, \
+		preprocessMethod=None, preprocessBudget=None, maxCutsetSize=None):
+	assignment = Assignment(csp)
+	if record:
+		assignment.stats = stats
+	trail = assignment.trail
+
+	assignment = eliminateUnaryConstraints(assignment, csp)
+	stats.endPhase('unary')
+	stats.addPruned('eliminateUnaryConstraints', len(trail))
+	if assignment == None:
+		return assignment
+
+	if compiled:
+		solution = solveCompiled(csp, assignment, orderValuesMethod, selectVariableMethod, inferenceMethod, useAC3)
+		stats.endPhase('search')
+		return solution
+	if useTables:
+		csp = compileTables(csp, assignment)
+		stats.endPhase('tables')
+
+	engine = csp.arcConsistency
+	revisions = engine.revisions
+	if useAC3:
+		mark = len(trail)
+		assignment = AC3(assignment, csp)
+		stats.endPhase('AC3')
+		stats.addPruned('AC3', len(trail) - mark)
+		if assignment == None:
+			stats.revisions += engine.revisions - revisions
+			return assignment
+	if preprocessMethod is not None:
+		mark = len(trail)
+		assignment = preprocessMethod(assignment, csp, preprocessBudget)
+		stats.endPhase('preprocess')
+		stats.addPruned(getattr(preprocessMethod, '__name__', str(preprocessMethod)), len(trail) - mark)
+		if assignment == None:
+			stats.revisions += engine.revisions - revisions
+			return assignment
+	if record and inferenceMethod is not None and inferenceMethod != noInferences:
+		inferenceMethod = countingInference(inferenceMethod, stats)
+	cutset = None
+	if searchMethod is None and maxCutsetSize is not None and not csp.allDifferentConstraints:
+		cutset = cycleCutset(assignment, csp, maxCutsetSize)
+	if searchMethod is not None:
+		assignment = searchMethod(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod or noInferences)
+	elif cutset is not None:
+		assignment = cutsetConditioning(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod or noInferences)
+	elif inferenceMethod is None or inferenceMethod==noInferences:
+		assignment = recursiveBacktracking(assignment, csp, orderValuesMethod, selectVariableMethod)
 	else:
 		assignment = recursiveBacktrackingWithInferences(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod)
+	stats.endPhase('search')
+	stats.revisions += engine.revisions - revisions
 	if assignment == None:
 		return assignment
 
 	return assignment.extractSolution()
+
+
+"""
+	Iterative depth-first search over every completion of an assignment.
+	The same assignment is extended in place throughout: each choice opens a decision level, as in
+	recursiveBacktrackingWithInferences, and the explicit stack holds the selected variable and the iterator over
+	its remaining values at every depth, so the search can be suspended at each solution. When the generator is
+	closed early the open levels are popped, leaving the assignment as it was passed in.
+
+	Args:
+		assignment (Assignment): a partial assignment to expand upon
+		csp (ConstraintSatisfactionProblem): the problem definition
+		orderValuesMethod (function<assignment, csp, variable> returns list<value>): a function to decide the next value to try
+		selectVariableMethod (function<assignment, csp> returns variable): a function to decide which variable to assign next
+		inferenceMethod (function<assignment, csp, variable, value> returns set<variable, value>): a function to specify what type of inferences to use
+	Returns:
+		generator<Assignment>
+		the assignment itself each time it is complete and consistent. It is only valid until the next value is requested.
+"""
+def searchAssignments(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod):
+	if inferenceMethod is None:
+		inferenceMethod = noInferences
+	depth = sum(1 for var in assignment.assignedValues if not assignment.isAssigned(var))
+	if depth == 0:
+		yield assignment
+		return
+
+	stack = []
+	try:
+		var = selectVariableMethod(assignment, csp)
+		stack.append((var, iter(orderValuesMethod(assignment, csp, var))))
+		while stack:
+			var, values = stack[-1]
+			if assignment.isAssigned(var):
+				assignment.popLevel()
+				assignment.unassign(var)
+			for value in values:
+				if consistent(assignment, csp, var, value):
+					assignment.pushLevel()
+					assignment.assign(var, value)
+					for otherValue in [otherValue for otherValue in assignment.varDomains[var] if otherValue != value]:
+						assignment.prune(var, otherValue)
+					if inferenceMethod(assignment, csp, var, value) != None:
+						break
+					assignment.popLevel()
+					assignment.unassign(var)
+			else:
+				stack.pop()
+				continue
+			if len(stack) == depth:
+				yield assignment
+			else:
+				var = selectVariableMethod(assignment, csp)
+				stack.append((var, iter(orderValuesMethod(assignment, csp, var))))
+	finally:
+		for var, values in reversed(stack):
+			if assignment.isAssigned(var):
+				assignment.popLevel()
+				assignment.unassign(var)
+
+
+"""
+	Builds the assignment that iterSolutions and countSolutions search from, the same way solve does.
+
+	Returns:
+		tuple<Assignment, ConstraintSatisfactionProblem>
+		the assignment and the problem to search, with None for the assignment if it is already inconsistent
+"""
+def initialAssignment(csp, useAC3=True, useTables=False):
+	assignment = eliminateUnaryConstraints(Assignment(csp), csp)
+	if assignment == None:
+		return None, csp
+	if useTables:
+		csp = compileTables(csp, assignment)
+	if useAC3:
+		assignment = AC3(assignment, csp)
+	return assignment, csp
+
+
+"""
+	Splits the search below an assignment into independent branches, one per consistent value of the variable
+	selectVariableMethod picks, with inferenceMethod applied. Every branch is an AssignmentSnapshot, so it can be
+	pickled and searched in another process from Assignment(csp, snapshot). The assignment is left as it was.
+
+	Args:
+		assignment (Assignment): a partial assignment to split
+		csp (ConstraintSatisfactionProblem): the problem definition
+		orderValuesMethod (function<assignment, csp, variable> returns list<value>): a function to decide the order of the branches
+		selectVariableMethod (function<assignment, csp> returns variable): a function to decide which variable to branch on
+		inferenceMethod (function<assignment, csp, variable, value> returns set<variable, value>): a function to specify what type of inferences to use
+	Returns:
+		list<AssignmentSnapshot>
+		the branches that inferenceMethod did not rule out. Empty if the assignment is complete.
+"""
+def splitAssignment(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod=noInferences):
+	if assignment.isComplete():
+		return []
+	branches = []
+	var = selectVariableMethod(assignment, csp)
+	for value in orderValuesMethod(assignment, csp, var):
+		if consistent(assignment, csp, var, value):
+			assignment.pushLevel()
+			assignment.assign(var, value)
+			for otherValue in [otherValue for otherValue in assignment.varDomains[var] if otherValue != value]:
+				assignment.prune(var, otherValue)
+			if inferenceMethod(assignment, csp, var, value) != None:
+				branches.append(assignment.snapshot())
+			assignment.popLevel()
+			assignment.unassign(var)
+	return branches
+
+
+"""
+	Generates every solution of a binary constraint satisfaction problem, one at a time.
+	Solutions are found lazily by searchAssignments, so only the current branch is held in memory however
+	many solutions there are. Every value has to be tried anyway, so orderValues is the default ordering.
+
+	Args:
+		csp (ConstraintSatisfactionProblem): a CSP to be solved
+		orderValuesMethod (function): a function to decide the next value to try
+		selectVariableMethod (function): a function to decide which variable to assign next
+		inferenceMethod (function): a function to specify what type of inferences to use
+		useAC3 (boolean): specifies whether to use the AC3 preprocessing step or not
+		useTables (boolean): specifies whether to compile the binary constraints into TableConstraints or not
+		copy (boolean): if False, the live map of assigned values is yielded instead of a copy. It is only
+				valid until the next solution is requested.
+	Returns:
+		generator<dictionary<string, value>>
+		a map from variables to their assigned values for each solution
+"""
+def iterSolutions(csp, orderValuesMethod=orderValues, selectVariableMethod=minimumRemainingValuesHeuristic, inferenceMethod=None, useAC3=True, useTables=False, copy=True):
+	assignment, csp = initialAssignment(csp, useAC3, useTables)
+	if assignment == None:
+		return
+	for assignment in searchAssignments(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod):
+		yield dict(assignment.assignedValues) if copy else assignment.assignedValues
+
+
+"""
+	Counts the solutions of a binary constraint satisfaction problem.
+	Runs the same search as iterSolutions without building a dictionary per solution.
+
+	Args:
+		see iterSolutions
+	Returns:
+		int
+		the number of solutions
+"""
+def countSolutions(csp, orderValuesMethod=orderValues, selectVariableMethod=minimumRemainingValuesHeuristic, inferenceMethod=None, useAC3=True, useTables=False):
+	assignment, csp = initialAssignment(csp, useAC3, useTables)
+	if assignment == None:
+		return 0
+	count = 0
+	for assignment in searchAssignments(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod):
+		count += 1
+	return count
+
+
+
+####################################################################################################
+
+
+class CompiledCSP:
+	"""
+	Integer-indexed form of a constraint satisfaction problem.
+	Variables are numbered in the order of csp.varDomains and the values of every variable are numbered
+	in the order of its domain. A domain is then a single integer bitmask where bit k is set while value k
+	is still possible, so domain tests, wipeout checks and restores are a few integer operations each.
+
+	Every binary constraint is compiled into two arcs, one per direction. Arc k is arcs[k] = (var, otherVar,
+	constraint, supports) where supports[value] is the bitmask of the values of otherVar compatible with value
+	of var, so revising or forward checking an arc intersects bitmasks instead of calling isSatisfied.
+	The tables are built once by calling isSatisfied for every pair of values, which takes the sum over the
+	constraints of the product of their domain sizes.
+	varArcs[var] lists the arcs leaving var and reverseArc[k] is the arc of the same constraint in the other direction.
+	AllDifferentConstraints are compiled as their pairwise NotEqualConstraints.
+
+	Args:
+		csp (ConstraintSatisfactionProblem): the problem to compile
+		assignment (Assignment): optional assignment whose current domains are compiled instead of the csp domains
+	"""
+	def __init__(self, csp, assignment=None):
+		varDomains = csp.varDomains if assignment is None else assignment.varDomains
+		self.variables = list(csp.varDomains)
+		self.varIndex = dict((var, i) for i, var in enumerate(self.variables))
+		self.values = [list(varDomains[var]) for var in self.variables]
+		self.valueIndex = [dict((value, k) for k, value in enumerate(values)) for values in self.values]
+		self.domains = [(1 << len(values)) - 1 for values in self.values]
+		self.arcs = []
+		self.reverseArc = []
+		self.varArcs = [[] for var in self.variables]
+		pairwise = [bc for constraint in csp.allDifferentConstraints for bc in constraint.pairwise()]
+		for constraint in csp.binaryConstraints + pairwise:
+			i = self.varIndex[constraint.var1]
+			j = self.varIndex[constraint.var2]
+			k = len(self.arcs)
+			self.arcs.append((i, j, constraint, self.supportMasks(constraint, i, j)))
+			self.arcs.append((j, i, constraint, self.supportMasks(constraint, j, i)))
+			self.reverseArc.extend([k + 1, k])
+			self.varArcs[i].append(k)
+			self.varArcs[j].append(k + 1)
+
+	"""
+	Builds the support table of the arc from var to otherVar.
+
+	Returns:
+		list<int>
+		for every value of var, the bitmask of the values of otherVar it can be paired with
+	"""
+	def supportMasks(self, constraint, var, otherVar):
+		otherValues = list(enumerate(self.values[otherVar]))
+		supports = []
+		for value in self.values[var]:
+			mask = 0
+			for otherValue, otherVal in otherValues:
+				if constraint.isSatisfied(value, otherVal):
+					mask |= 1 << otherValue
+			supports.append(mask)
+		return supports
+
+	def __repr__(self):
+	    return '---Variables\n%s---Arcs\n%s' % ( \
+	        ''.join([str(i) + ':' + str(var) + ' ' + str(self.values[i]) + '\n' for i, var in enumerate(self.variables)]), \
+	        ''.join([str(i) + '->' + str(j) + ':' + str(c) + '\n' for (i, j, c, supports) in self.arcs]))
+
+
+class CompiledAssignment:
+	"""
+	Representation of a partial assignment over a CompiledCSP.
+	Domains are a list of bitmasks and assigned values a list of value indices, with None being no assignment.
+	Every domain change is logged on a trail as (variable, old domain) so it can be undone by popping back
+	to a mark taken with len(assignment.trail).
+
+	Args:
+		compiled (CompiledCSP): the compiled problem definition for this assignment
+		assignment (Assignment): optional string-keyed assignment whose domains and assigned values are copied
+	"""
+	def __init__(self, compiled, assignment=None):
+		self.compiled = compiled
+		self.domains = list(compiled.domains)
+		self.assignedValues = [None] * len(compiled.variables)
+		self.trail = []
+		if assignment is not None:
+			for i, var in enumerate(compiled.variables):
+				index = compiled.valueIndex[i]
+				self.domains[i] = 0
+				for value in assignment.varDomains[var]:
+					if value in index:
+						self.domains[i] |= 1 << index[value]
+				if assignment.isAssigned(var):
+					self.assignedValues[i] = index[assignment.assignedValues[var]]
+
+	def isAssigned(self, var):
+		return self.assignedValues[var] is not None
+
+	def isComplete(self):
+		return None not in self.assignedValues
+
+	"""
+	Restricts the domain of var to the values in mask, recording the old domain on the trail.
+
+	Args:
+		var (int): the variable index
+		mask (int): bitmask of the values that may stay in the domain
+	Returns:
+		int
+		the new domain of var, 0 if it was wiped out
+	"""
+	def prune(self, var, mask):
+		old = self.domains[var]
+		new = old & mask
+		if new != old:
+			self.trail.append((var, old))
+			self.domains[var] = new
+		return new
+
+	"""
+	Restores every domain changed since the trail had length mark.
+	"""
+	def undo(self, mark):
+		trail = self.trail
+		domains = self.domains
+		while len(trail) > mark:
+			var, old = trail.pop()
+			domains[var] = old
+
+	def extractSolution(self):
+		if not self.isComplete():
+			return None
+		compiled = self.compiled
+		return dict((var, compiled.values[i][self.assignedValues[i]]) for i, var in enumerate(compiled.variables))
+
+	def __repr__(self):
+	    return '---Variable Domains\n%s---Assigned Values\n%s' % ( \
+	        ''.join([str(var) + ':' + bin(self.domains[i]) + '\n' for i, var in enumerate(self.compiled.variables)]), \
+	        ''.join([str(var) + ':' + str(self.assignedValues[i]) + '\n' for i, var in enumerate(self.compiled.variables)]))
+
+
+"""
+	Lists the indices of the bits set in a domain bitmask, lowest first.
+"""
+def bitIndices(mask):
+	indices = []
+	while mask:
+		low = mask & -mask
+		indices.append(low.bit_length() - 1)
+		mask ^= low
+	return indices
+
+
+"""
+	Number of values left in a domain bitmask.
+"""
+def domainSize(mask):
+	return bin(mask).count('1')
+
+
+"""
+	Compiled counterpart of consistent.
+	Checks value index value of var against every assigned neighbour of var with one bit test per arc.
+"""
+def compiledConsistent(assignment, compiled, var, value):
+	assignedValues = assignment.assignedValues
+	arcs = compiled.arcs
+	for k in compiled.varArcs[var]:
+		otherVar = arcs[k][1]
+		otherValue = assignedValues[otherVar]
+		if otherValue is not None and not arcs[k][3][value] >> otherValue & 1:
+			return False
+	return True
+
+
+"""
+	Compiled counterpart of chooseFirstVariable.
+"""
+def compiledChooseFirstVariable(assignment, compiled):
+	return assignment.assignedValues.index(None)
+
+
+"""
+	Compiled counterpart of minimumRemainingValuesHeuristic.
+	Ties on domain size are broken by the number of constraints shared with unassigned variables.
+"""
+def compiledMinimumRemainingValues(assignment, compiled):
+	assignedValues = assignment.assignedValues
+	arcs = compiled.arcs
+	best = None
+	bestKey = None
+	for var, mask in enumerate(assignment.domains):
+		if assignedValues[var] is not None:
+			continue
+		size = domainSize(mask)
+		if bestKey is not None and size > bestKey[0]:
+			continue
+		degree = 0
+		for k in compiled.varArcs[var]:
+			if assignedValues[arcs[k][1]] is None:
+				degree += 1
+		if bestKey is None or (size, -degree) < bestKey:
+			best = var
+			bestKey = (size, -degree)
+	return best
+
+
+"""
+	Compiled counterpart of orderValues.
+"""
+def compiledOrderValues(assignment, compiled, var):
+	return bitIndices(assignment.domains[var])
+
+
+"""
+	Compiled counterpart of leastConstrainingValuesHeuristic.
+	The values of a neighbour ruled out by a value are its domain minus the supports of that value.
+"""
+def compiledLeastConstrainingValues(assignment, compiled, var):
+	domains = assignment.domains
+	arcs = [compiled.arcs[k] for k in compiled.varArcs[var]]
+	valList = []
+	for value in bitIndices(domains[var]):
+		constrainedValTotal = 0
+		for i, otherVar, bc, supports in arcs:
+			constrainedValTotal += domainSize(domains[otherVar] & ~supports[value])
+		valList.append((value, constrainedValTotal))
+	valList.sort(key=lambda x: x[1])
+	return [value for value, constrainedValTotal in valList]
+
+
+"""
+	Compiled counterpart of noInferences.
+	Compiled inference methods prune through assignment.prune and return False on a wipeout.
+"""
+def compiledNoInferences(assignment, compiled, var, value):
+	return True
+
+
+"""
+	Compiled counterpart of forwardChecking.
+	The domain of every unassigned neighbour is intersected with the supports of value.
+	Pruned values stay on the trail; the caller undoes them on failure.
+"""
+def compiledForwardChecking(assignment, compiled, var, value):
+	assignedValues = assignment.assignedValues
+	arcs = compiled.arcs
+	for k in compiled.varArcs[var]:
+		i, otherVar, bc, supports = arcs[k]
+		if assignedValues[otherVar] is None and assignment.prune(otherVar, supports[value]) == 0:
+			return False
+	return True
+
+
+"""
+	Compiled counterpart of revise.
+	Removes the values of the first variable of arc k that have no support left in the second.
+
+	Returns:
+		int
+		the new domain of the revised variable, 0 if it was wiped out
+"""
+def compiledRevise(assignment, compiled, k):
+	var, otherVar, constraint, supports = compiled.arcs[k]
+	otherDomain = assignment.domains[otherVar]
+	keep = 0
+	for value in bitIndices(assignment.domains[var]):
+		if supports[value] & otherDomain:
+			keep |= 1 << value
+	return assignment.prune(var, keep)
+
+
+"""
+	Propagates arc consistency from the arcs in queue until no domain changes.
+	The queue holds arc indices; revising arc k = (var, otherVar, ...) checks the values of var against otherVar.
+"""
+def compiledPropagate(assignment, compiled, queue):
+	arcs = compiled.arcs
+	varArcs = compiled.varArcs
+	reverseArc = compiled.reverseArc
+	domains = assignment.domains
+	pending = set(queue)
+	while queue:
+		k = queue.popleft()
+		pending.discard(k)
+		var = arcs[k][0]
+		before = domains[var]
+		after = compiledRevise(assignment, compiled, k)
+		if after == 0:
+			return False
+		if after != before:
+			for out in varArcs[var]:
+				if out != k:
+					newArc = reverseArc[out]
+					if newArc not in pending:
+						pending.add(newArc)
+						queue.append(newArc)
+	return True
+
+
+"""
+	Compiled counterpart of maintainArcConsistency.
+"""
+def compiledMaintainArcConsistency(assignment, compiled, var, value):
+	reverseArc = compiled.reverseArc
+	queue = deque(reverseArc[k] for k in compiled.varArcs[var])
+	return compiledPropagate(assignment, compiled, queue)
+
+
+"""
+	Compiled counterpart of AC3. Seeds the queue once with every arc.
+
+	Returns:
+		boolean
+		False if a domain was wiped out, True otherwise
+"""
+def compiledAC3(assignment, compiled):
+	return compiledPropagate(assignment, compiled, deque(xrange(len(compiled.arcs))))
+
+
+"""
+	Recursive backtracking over a CompiledAssignment.
+	The variable just assigned has its domain reduced to the chosen value, and every domain change
+	made below a choice is undone by rolling the trail back to the mark taken before it.
+
+	Args:
+		assignment (CompiledAssignment): a partial assignment to expand upon
+		compiled (CompiledCSP): the problem definition
+		orderValuesMethod (function<assignment, compiled, variable> returns list<int>): compiled value ordering
+		selectVariableMethod (function<assignment, compiled> returns int): compiled variable selection
+		inferenceMethod (function<assignment, compiled, variable, value> returns boolean): compiled inference
+	Returns:
+		CompiledAssignment
+		A completed and consistent assignment. None if no solution exists.
+"""
+def compiledBacktracking(assignment, compiled, orderValuesMethod, selectVariableMethod, inferenceMethod):
+	if assignment.isComplete():
+		return assignment
+
+	var = selectVariableMethod(assignment, compiled)
+	for value in orderValuesMethod(assignment, compiled, var):
+		if compiledConsistent(assignment, compiled, var, value):
+			mark = len(assignment.trail)
+			assignment.assignedValues[var] = value
+			assignment.prune(var, 1 << value)
+			if inferenceMethod(assignment, compiled, var, value):
+				result = compiledBacktracking(assignment, compiled, orderValuesMethod, selectVariableMethod, inferenceMethod)
+				if result is not None:
+					return result
+			assignment.undo(mark)
+			assignment.assignedValues[var] = None
+	return None
+
+
+"""
+	Maps the string-keyed solver functions to their compiled counterparts.
+"""
+compiledMethods = {
+	chooseFirstVariable: compiledChooseFirstVariable,
+	minimumRemainingValuesHeuristic: compiledMinimumRemainingValues,
+	orderValues: compiledOrderValues,
+	leastConstrainingValuesHeuristic: compiledLeastConstrainingValues,
+	None: compiledNoInferences,
+	noInferences: compiledNoInferences,
+	forwardChecking: compiledForwardChecking,
+	maintainArcConsistency: compiledMaintainArcConsistency,
+}
+
+def compiledMethod(method):
+	if method not in compiledMethods:
+		raise ValueError('No compiled counterpart for %s' % getattr(method, '__name__', method))
+	return compiledMethods[method]
+
+
+"""
+	Solves a problem on its CompiledCSP form, starting from an assignment with unary constraints eliminated.
+	Takes the same methods as solve and returns the same string-keyed solution.
+
+	Args:
+		csp (ConstraintSatisfactionProblem): the problem to solve
+		assignment (Assignment): the starting assignment
+		orderValuesMethod (function): a function to decide the next value to try
+		selectVariableMethod (function): a function to decide which variable to assign next
+		inferenceMethod (function): a function to specify what type of inferences to use
+		useAC3 (boolean): specifies whether to use the AC3 preprocessing step or not
+	Returns:
+		dictionary<string, value>
+		A map from variables to their assigned values. None if no solution exists.
+"""
+def solveCompiled(csp, assignment, orderValuesMethod, selectVariableMethod, inferenceMethod, useAC3):
+	compiled = CompiledCSP(csp, assignment)
+	compiledAssignment = CompiledAssignment(compiled, assignment)
+	if 0 in compiledAssignment.domains:
+		return None
+	if useAC3 and not compiledAC3(compiledAssignment, compiled):
+		return None
+	compiledAssignment = compiledBacktracking(compiledAssignment, compiled, compiledMethod(orderValuesMethod), \
+		compiledMethod(selectVariableMethod), compiledMethod(inferenceMethod))
+	if compiledAssignment is None:
+		return None
+	return compiledAssignment.extractSolution()
+
+
+
+####################################################################################################
+
+
+"""
+	Runs one configuration of a portfolio in a worker process.
+
+	Args:
+		job (tuple<int, ConstraintSatisfactionProblem, tuple, int>): the index of the configuration, the problem,
+				the configuration and the random seed, or None for no randomization
+	Returns:
+		tuple<int, dictionary<string, value>>
+		the index of the configuration and its solve result
+"""
+def portfolioWorker(job):
+	index, csp, config, seed = job
+	if seed is not None:
+		random.seed(seed)
+		config = tuple(randomizedMethods.get(method, method) for method in config)
+	try:
+		return index, True, solve(csp, *config)
+	except Exception:
+		return index, False, traceback.format_exc()
+
+
+"""
+	Solves a problem with several solve configurations at once, one per worker process, and returns the
+	result of whichever finishes first. Every configuration is a complete search, so the first result is
+	final whether it is a solution or None. The remaining workers are terminated once it arrives. A configuration
+	that raises an error is left out and the others keep racing; if all of them fail, a RuntimeError with their
+	tracebacks is raised.
+
+	Examples of configurations:
+	(leastConstrainingValuesHeuristic, minimumRemainingValuesHeuristic, maintainArcConsistency)
+	(orderValues, chooseFirstVariable, forwardChecking, False)
+
+	Args:
+		csp (ConstraintSatisfactionProblem): a CSP to be solved
+		configs (list<tuple>): positional arguments for solve after csp, one tuple per configuration
+		workers (int): number of worker processes, defaults to one per configuration so that they all race even on
+				fewer cores. With fewer workers the later configurations wait for the earlier ones to finish.
+		randomize (boolean): specifies whether to break heuristic ties at random, with a different seed per configuration
+		seed (int): base random seed; configuration i uses seed + i
+	Returns:
+		dictionary<string, value>
+		A map from variables to their assigned values. None if no solution exists.
+"""
+def solvePortfolio(csp, configs, workers=None, randomize=False, seed=0):
+	if workers is None:
+		workers = len(configs)
+	jobs = [(i, csp, tuple(config), seed + i if randomize else None) for i, config in enumerate(configs)]
+	pool = multiprocessing.Pool(workers)
+	errors = []
+	try:
+		for index, solved, solution in pool.imap_unordered(portfolioWorker, jobs):
+			if solved:
+				return solution
+			errors.append(solution)
+	finally:
+		pool.terminate()
+		pool.join()
+	raise RuntimeError('Every configuration of the portfolio failed:\n%s' % '\n'.join(errors))
+
+
+"""
+	Turns a problem given to solveBatch into a ConstraintSatisfactionProblem.
+	Testing is imported here rather than at the top because it imports this module.
+"""
+def batchProblem(problem):
+	import Testing
+	if isinstance(problem, ConstraintSatisfactionProblem):
+		return problem
+	if isinstance(problem, basestring):
+		if '\n' not in problem:
+			return Testing.load_csp(problem)
+		problem = problem.splitlines()
+	return Testing.csp_parse([line for line in problem if line.strip()])
+
+
+def startBatchWorker():
+	global tableCache
+	tableCache = {}
+
+
+"""
+	True while batchWorker is inside solve. The timer may still fire once solve has returned, and batchTimeout only
+	stops the search while it is running.
+"""
+batchSolving = False
+
+def batchTimeout(signum, frame):
+	if batchSolving:
+		raise SearchCutoff()
+
+
+"""
+	Solves one problem of a batch, stopping it with SIGALRM after timeout seconds.
+
+	Args:
+		job (tuple<int, problem, tuple, float>): the index of the problem, the problem, the configuration and the timeout
+	Returns:
+		tuple<int, string, dictionary<string, value>>
+		the index, the status ('solved', 'unsatisfiable', 'timeout' or 'error') and the solution, or the error message
+"""
+def batchWorker(job):
+	global batchSolving
+	index, problem, config, timeout = job
+	if timeout is not None:
+		previousHandler = signal.signal(signal.SIGALRM, batchTimeout)
+		signal.setitimer(signal.ITIMER_REAL, timeout)
+	try:
+		batchSolving = True
+		try:
+			solution = solve(batchProblem(problem), *config)
+		finally:
+			batchSolving = False
+		return index, 'unsatisfiable' if solution is None else 'solved', solution
+	except SearchCutoff:
+		return index, 'timeout', None
+	except Exception:
+		return index, 'error', traceback.format_exc()
+	finally:
+		if timeout is not None:
+			signal.setitimer(signal.ITIMER_REAL, 0)
+			signal.signal(signal.SIGALRM, previousHandler)
+
+
+"""
+	Solves many problems with one solve configuration on a shared pool of worker processes and generates the
+	results as they are ready. Problems can be given as ConstraintSatisfactionProblems, as the text or the list of
+	lines of a .csp file, or as the path of one. Every worker keeps a tableCache for its lifetime, so with useTables
+	problems that share their constraints and domains reuse the same TableConstraints.
+
+	Examples of configurations:
+	(leastConstrainingValuesHeuristic, minimumRemainingValuesHeuristic, forwardChecking)
+	(orderValues, minimumRemainingValuesHeuristic, maintainArcConsistency, True, False, True)
+
+	Args:
+		problems (iterable<problem>): the problems to solve
+		config (tuple): positional arguments for solve after csp
+		workers (int): number of worker processes, defaults to the number of cores. 0 solves in this process.
+		ordered (boolean): specifies whether to generate the results in the order of problems or as they complete
+		timeout (float): seconds after which a problem is abandoned with the status 'timeout', None for no limit.
+				Relies on SIGALRM, so it is only available on Unix.
+		chunksize (int): number of problems sent to a worker at a time
+	Returns:
+		generator<tuple<int, string, dictionary<string, value>>>
+		the index of each problem, its status ('solved', 'unsatisfiable', 'timeout' or 'error') and its solution,
+		or the error message
+"""
+def solveBatch(problems, config=(), workers=None, ordered=True, timeout=None, chunksize=1):
+	global tableCache
+	jobs = ((i, problem, tuple(config), timeout) for i, problem in enumerate(problems))
+	if workers == 0:
+		previousCache = tableCache
+		tableCache = {}
+		try:
+			for job in jobs:
+				yield batchWorker(job)
+		finally:
+			tableCache = previousCache
+		return
+
+	pool = multiprocessing.Pool(workers or multiprocessing.cpu_count(), startBatchWorker)
+	try:
+		results = pool.imap(batchWorker, jobs, chunksize) if ordered else pool.imap_unordered(batchWorker, jobs, chunksize)
+		for result in results:
+			yield result
+	finally:
+		pool.terminate()
+		pool.join()
@@ -1,5 +1,17 @@
+import os
+import hashlib
+import cPickle
+import shutil
+import tempfile
 import BinaryCSP
 
+# Directory, relative to each .csp file, holding the parsed problems keyed by the sha1 of their source.
+CSP_CACHE_DIR = '.csp_cache'
+# Bump when the format returned by csp_spec or of the cache files changes so stale cache files are ignored.
+CSP_CACHE_VERSION = 2
+# sha1 of a .csp file -> its csp_spec, for files already loaded by this process.
+csp_specs = {}
+
 def get_lines(fileName):
     lines = []
     with open(fileName,'r') as readFile:
@@ -19,30 +31,208 @@ def get_lines(fileName):
     unary_constraint_type inputs ... 
     ... """
 def csp_parse(csp_lines):
+    return csp_build(csp_spec(csp_lines))
+
+""" Takes a list of lines in the csp_parse format and returns the problem as plain tuples:
+    (variables, domains, binary_constraints, unary_constraints), where domains[i] is the tuple of values of
+    variables[i] and each constraint is a (constraint_type, inputs) pair. """
+def csp_spec(csp_lines):
     i = 0
     variables = []
     domains = []
     while csp_lines[i].strip() != '0':
         line = csp_lines[i].split()
         variables.append(line[0])
-        domains.append(set(line[1:]))
+        domains.append(tuple(line[1:]))
         i += 1
     i += 1
 
     binary_constraints = []
     while csp_lines[i].strip() != '0':
         line = csp_lines[i].split()
-        binary_constraints.append(getattr(BinaryCSP, line[0])(*line[1:]))
+        binary_constraints.append((line[0], tuple(line[1:])))
         i += 1
     i += 1
 
     unary_constraints = []
     while i < len(csp_lines):
         line = csp_lines[i].split()
-        unary_constraints.append(getattr(BinaryCSP, line[0])(*line[1:]))
+        unary_constraints.append((line[0], tuple(line[1:])))
         i += 1
 
-    return BinaryCSP.ConstraintSatisfactionProblem(variables, domains, binary_constraints, unary_constraints)
+    return tuple(variables), tuple(domains), tuple(binary_constraints), tuple(unary_constraints)
+
+""" Checks that spec has the shape of the tuples returned by csp_spec. """
+def is_csp_spec(spec):
+    if not isinstance(spec, tuple) or len(spec) != 4 or not all(isinstance(part, tuple) for part in spec):
+        return False
+    variables, domains, binary_constraints, unary_constraints = spec
+    return len(variables) == len(domains) and all(isinstance(domain, tuple) for domain in domains) and \
+        all(isinstance(constraint, tuple) and len(constraint) == 2 and isinstance(constraint[1], tuple) \
+            for constraint in binary_constraints + unary_constraints)
+
+""" Creates a fresh CSP representation from the tuples returned by csp_spec.
+    Constraint types are looked up once each rather than once per line. """
+def csp_build(spec):
+    variables, domains, binary_specs, unary_specs = spec
+    types = {}
+    def construct(constraint_type, inputs):
+        if constraint_type not in types:
+            types[constraint_type] = getattr(BinaryCSP, constraint_type)
+        return types[constraint_type](*inputs)
+    binary_constraints = [construct(constraint_type, inputs) for constraint_type, inputs in binary_specs]
+    unary_constraints = [construct(constraint_type, inputs) for constraint_type, inputs in unary_specs]
+    return BinaryCSP.ConstraintSatisfactionProblem(list(variables), [set(domain) for domain in domains], \
+        binary_constraints, unary_constraints)
+
+""" Reads the csp_spec cached in cache_file for a .csp file with the given sha1.
+    Returns None if the file is missing or cannot be unpickled, or if it holds anything but a spec of the
+    current CSP_CACHE_VERSION for that sha1. """
+def read_csp_cache(cache_file, digest):
+    try:
+        with open(cache_file, 'rb') as cached:
+            version, source_digest, spec = cPickle.load(cached)
+    except Exception:
+        return None
+    if version != CSP_CACHE_VERSION or source_digest != digest or not is_csp_spec(spec):
+        return None
+    return spec
+
+""" Loads a .csp file. Each file is parsed once: its csp_spec is memoized for the rest of the process
+    and pickled to CSP_CACHE_DIR next to the file, keyed by the sha1 of the file contents, so later runs
+    skip parsing as well. An edited file gets a new key and is parsed again. The cache is only an
+    optimization: if it cannot be read or written the file is simply parsed, and an unreadable cache
+    file is replaced. The spec is cached rather than the built CSP, since unpickling the constraint
+    objects and their indexes takes longer than csp_build.
+    Every call returns a new CSP, so callers may modify it freely. """
+def load_csp(fileName):
+    with open(fileName, 'rb') as csp_file:
+        source = csp_file.read()
+    digest = hashlib.sha1(source).hexdigest()
+    if digest not in csp_specs:
+        cache_file = os.path.join(os.path.dirname(fileName), CSP_CACHE_DIR, '%s.v%d.pickle' % (digest, CSP_CACHE_VERSION))
+        spec = read_csp_cache(cache_file, digest)
+        if spec is None:
+            spec = csp_spec(source.splitlines(True))
+            try:
+                if not os.path.isdir(os.path.dirname(cache_file)):
+                    os.makedirs(os.path.dirname(cache_file))
+                partial_file = '%s.%d.tmp' % (cache_file, os.getpid())
+                with open(partial_file, 'wb') as cached:
+                    cPickle.dump((CSP_CACHE_VERSION, digest, spec), cached, cPickle.HIGHEST_PROTOCOL)
+                os.rename(partial_file, cache_file)
+            except (IOError, OSError):
+                pass
+        csp_specs[digest] = spec
+    return csp_build(csp_specs[digest])
+
+""" Loads a copy of a .csp file in a temporary directory several times, clearing the memo in between:
+    with no cache file, from the cache, after the cache file is overwritten by a pickle that cannot be
+    unpickled, from the cache again, after it is overwritten by a pickle of the wrong shape, and after a
+    variable Z is added to the copy. Used by the autograder to check load_csp.
+    Returns a list with, for each load, whether the file was parsed and the domains of the CSP as sorted
+    lists, and the number of cache files left. """
+def check_csp_cache(fileName):
+    global csp_spec
+    parse = csp_spec
+    parses = []
+    def counting_spec(csp_lines):
+        parses.append(len(csp_lines))
+        return parse(csp_lines)
+    memo = dict(csp_specs)
+    directory = tempfile.mkdtemp()
+    copy = os.path.join(directory, os.path.basename(fileName))
+    cache_dir = os.path.join(directory, CSP_CACHE_DIR)
+    loads = []
+    def load():
+        csp_specs.clear()
+        del parses[:]
+        csp = load_csp(copy)
+        loads.append((len(parses) > 0, dict((var, sorted(domain)) for var, domain in csp.varDomains.items())))
+    def overwrite_cache(contents):
+        for cache_file in os.listdir(cache_dir):
+            with open(os.path.join(cache_dir, cache_file), 'wb') as cached:
+                cached.write(contents)
+    csp_spec = counting_spec
+    try:
+        shutil.copy(fileName, copy)
+        load()
+        load()
+        overwrite_cache('cnosuchmod\nnosuchname\n.')
+        load()
+        load()
+        overwrite_cache(cPickle.dumps((CSP_CACHE_VERSION, 'digest', 'spec'), cPickle.HIGHEST_PROTOCOL))
+        load()
+        with open(fileName, 'rb') as csp_file:
+            source = csp_file.read()
+        with open(copy, 'wb') as csp_file:
+            csp_file.write('Z R G B\n' + source)
+        load()
+        return loads, len(os.listdir(cache_dir))
+    finally:
+        csp_spec = parse
+        csp_specs.clear()
+        csp_specs.update(memo)
+        shutil.rmtree(directory, True)
+
+""" Calls inferenceMethod for value assigned to var with a decision level open, as the search calls it,
+    and closes the level again. Used by the autograder to check that inferences are reported at any depth. """
+def inferences_in_level(assignment, csp, var, value, inferenceMethod):
+    assignment.pushLevel()
+    try:
+        return inferenceMethod(assignment, csp, var, value)
+    finally:
+        assignment.popLevel()
+
+""" Runs BinaryCSP.solvePortfolio on csp with a configuration that fails in its worker, a compiled search with
+    domainOverWeightedDegree, which has no compiled counterpart, next to one that works, and then with the
+    failing configuration alone. Used by the autograder to check that one failure does not stop the others.
+    Returns the solution of the first run and the name of the error raised by the second, or None. """
+def check_portfolio(csp):
+    failing = (BinaryCSP.orderValues, BinaryCSP.domainOverWeightedDegree, None, True, True)
+    working = (BinaryCSP.orderValues, BinaryCSP.minimumRemainingValuesHeuristic, BinaryCSP.forwardChecking)
+    solution = BinaryCSP.solvePortfolio(csp, [failing, working])
+    try:
+        BinaryCSP.solvePortfolio(csp, [failing])
+    except Exception as e:
+        return solution, type(e).__name__
+    return solution, None
+
+""" Runs BinaryCSP.solveBatch on the .csp file fileName in two ways. First, on one worker process with a timeout of
+    0.2 seconds, after a pigeonhole problem of 10 variables with 9 values each that backtracking cannot finish in
+    that time. Then in this process with useTables, twice over, recording the TableConstraints the inference sees.
+    Used by the autograder to check the timeout and the table cache.
+    Returns the statuses of the first batch, the number of different TableConstraints searched and of binary
+    constraints in the problem, and whether BinaryCSP.tableCache was restored afterwards. """
+def check_batch(fileName):
+    lines = ['P%d %s' % (i, ' '.join(str(hole) for hole in xrange(9))) for i in xrange(10)] + ['0'] + \
+        ['NotEqualConstraint P%d P%d' % (i, j) for i in xrange(10) for j in xrange(i + 1, 10)] + ['0']
+    config = (BinaryCSP.orderValues, BinaryCSP.chooseFirstVariable, None, False)
+    statuses = [status for index, status, solution in BinaryCSP.solveBatch(['\n'.join(lines), fileName], config, 1, timeout=0.2)]
+
+    tables = set()
+    def recording_inference(assignment, csp, var, value):
+        tables.update(csp.binaryConstraints)
+        return BinaryCSP.forwardChecking(assignment, csp, var, value)
+    previousCache = BinaryCSP.tableCache
+    config = (BinaryCSP.orderValues, BinaryCSP.minimumRemainingValuesHeuristic, recording_inference, True, False, True)
+    for result in BinaryCSP.solveBatch([fileName, fileName], config, 0):
+        pass
+    return statuses, len(tables), len(load_csp(fileName).binaryConstraints), BinaryCSP.tableCache is previousCache
+
+""" Splits assignment with BinaryCSP.splitAssignment, passes every branch through a pickle and starts a new
+    Assignment from it, as a worker process would. Used by the autograder to check snapshots and splitting.
+    Returns, for each branch, the assigned values and the domains of the restored Assignment as sorted lists,
+    and whether the domains and assigned values of assignment were left as they were. """
+def check_split(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod):
+    before = assignment.snapshot()
+    branches = []
+    for snapshot in BinaryCSP.splitAssignment(assignment, csp, orderValuesMethod, selectVariableMethod, inferenceMethod):
+        restored = BinaryCSP.Assignment(csp, cPickle.loads(cPickle.dumps(snapshot, cPickle.HIGHEST_PROTOCOL)))
+        branches.append((dict((var, value) for var, value in restored.assignedValues.items() if value is not None), \
+            dict((var, sorted(domain)) for var, domain in restored.varDomains.items())))
+    after = assignment.snapshot()
+    return branches, before.varDomains == after.varDomains and before.assignedValues == after.assignedValues
 
 """ Takes a list of lines and creates an Assignment representation.
     Format:
@@ -53,22 +243,23 @@ def csp_parse(csp_lines):
     variable assigned_value
     ... """
 def assignment_parse(assignment_lines):
-    csp = None
-    with open(assignment_lines[0].strip()) as csp_file:
-        csp = csp_parse(csp_file.readlines())
+    csp = load_csp(assignment_lines[0].strip())
     assignment = BinaryCSP.Assignment(csp)
 
+    # Domains are narrowed and values assigned through the Assignment, so the trail and snapshot see them.
     i = 1
     while assignment_lines[i].strip() != '0':
         line = assignment_lines[i].split()
-        assignment.varDomains[line[0]] = set(line[1:])
+        for value in [value for value in assignment.varDomains[line[0]] if value not in line[1:]]:
+            assignment.prune(line[0], value)
         i += 1
     i += 1
 
     while i < len(assignment_lines):
         line = assignment_lines[i].split()
-        assignment.assignedValues[line[0]] = line[1]
-        assignment.varDomains[line[0]] = set([line[1]])
+        assignment.assign(line[0], line[1])
+        for value in [value for value in assignment.varDomains[line[0]] if value != line[1]]:
+            assignment.prune(line[0], value)
         i += 1
 
     return assignment
@@ -0,0 +1,221 @@
+import argparse
+import json
+import math
+import random
+import signal
+import sys
+import time
+from os import listdir
+import BinaryCSP
+from Testing import load_csp
+
+valueMethods = [
+    ('ord', BinaryCSP.orderValues),
+    ('lcv', BinaryCSP.leastConstrainingValuesHeuristic)
+]
+variableMethods = [
+    ('first', BinaryCSP.chooseFirstVariable),
+    ('mrv', BinaryCSP.minimumRemainingValuesHeuristic)
+]
+inferenceMethods = [
+    ('none', BinaryCSP.noInferences),
+    ('fc', BinaryCSP.forwardChecking),
+    ('mac', BinaryCSP.maintainArcConsistency)
+]
+
+""" Creates the N-queens problem: one variable per column holding the row of its queen. """
+def queens_csp(n):
+    variables = ['Q%d' % i for i in xrange(1, n + 1)]
+    domains = [set(str(row) for row in xrange(1, n + 1)) for var in variables]
+    constraints = []
+    for i in xrange(n):
+        for j in xrange(i + 1, n):
+            constraints.append(BinaryCSP.NotEqualConstraint(variables[i], variables[j]))
+            constraints.append(BinaryCSP.NotInDiagonalConstraint(variables[i], variables[j], str(j - i)))
+    return BinaryCSP.ConstraintSatisfactionProblem(variables, domains, constraints, [])
+
+""" Creates a random 3-colouring problem with 2.3 edges per vertex, close to the phase transition
+    where random instances are hardest. """
+def coloring_csp(n, rng):
+    variables = ['V%d' % i for i in xrange(n)]
+    domains = [set(['R', 'G', 'B']) for var in variables]
+    edges = set()
+    while len(edges) < min(int(round(2.3 * n)), n * (n - 1) / 2):
+        i, j = rng.sample(xrange(n), 2)
+        edges.add((min(i, j), max(i, j)))
+    constraints = [BinaryCSP.NotEqualConstraint(variables[i], variables[j]) for i, j in sorted(edges)]
+    return BinaryCSP.ConstraintSatisfactionProblem(variables, domains, constraints, [])
+
+""" Creates a random sudoku with the given number of clues. The clues come from a shuffled solved grid,
+    so the puzzle has at least one solution, and are given as GoodValueConstraints like csps/sudoku1.csp. """
+def sudoku_csp(clues, rng):
+    digits = [str(d) for d in xrange(1, 10)]
+    rng.shuffle(digits)
+    def shuffled_lines():
+        bands = range(3)
+        rng.shuffle(bands)
+        lines = []
+        for band in bands:
+            inner = range(3)
+            rng.shuffle(inner)
+            lines.extend(band * 3 + line for line in inner)
+        return lines
+    rows = shuffled_lines()
+    cols = shuffled_lines()
+    grid = [[digits[(rows[r] * 3 + rows[r] / 3 + cols[c]) % 9] for c in xrange(9)] for r in xrange(9)]
+
+    variables = ['r%dc%d' % (r, c) for r in xrange(9) for c in xrange(9)]
+    domains = [set(digits) for var in variables]
+    pairs = set()
+    for a in xrange(81):
+        for b in xrange(a + 1, 81):
+            ra, ca, rb, cb = a / 9, a % 9, b / 9, b % 9
+            if ra == rb or ca == cb or (ra / 3 == rb / 3 and ca / 3 == cb / 3):
+                pairs.add((a, b))
+    constraints = [BinaryCSP.NotEqualConstraint(variables[a], variables[b]) for a, b in sorted(pairs)]
+    unary = [BinaryCSP.GoodValueConstraint(variables[cell], grid[cell / 9][cell % 9]) \
+        for cell in sorted(rng.sample(xrange(81), clues))]
+    return BinaryCSP.ConstraintSatisfactionProblem(variables, domains, constraints, unary)
+
+""" Lists the benchmark instances as (name, family, factory) triples. Every call of factory builds a fresh
+    problem, so no run sees state left behind by another. """
+def get_instances(families, queens_sizes, coloring_sizes, sudoku_count, sudoku_clues, seed):
+    instances = []
+    if 'csps' in families:
+        for file_name in sorted(listdir('csps')):
+            if file_name.endswith('.csp'):
+                instances.append((file_name, 'csps', lambda path='csps/' + file_name: load_csp(path)))
+    if 'queens' in families:
+        for n in queens_sizes:
+            instances.append(('queens-%d' % n, 'queens', lambda n=n: queens_csp(n)))
+    if 'coloring' in families:
+        for n in coloring_sizes:
+            instances.append(('coloring-%d' % n, 'coloring', lambda n=n: coloring_csp(n, random.Random('%d-%d' % (seed, n)))))
+    if 'sudoku' in families:
+        for i in xrange(sudoku_count):
+            instances.append(('sudoku-%d' % i, 'sudoku', lambda i=i: sudoku_csp(sudoku_clues, random.Random('%d-%d' % (seed, i)))))
+    return instances
+
+""" Solves one instance with one configuration. The search is cut off after node_limit nodes by raising
+    SearchCutoff from the node callback. A single node of maintainArcConsistency on a large instance can take
+    seconds, so the time limit is enforced with a SIGALRM timer raising SearchCutoff wherever the solve is. """
+def run_benchmark(name, family, factory, config, use_ac3, node_limit, time_limit, decompose=True):
+    (value_name, value_method), (variable_name, variable_method), (inference_name, inference_method) = config
+    csp = factory()
+    search = {}
+    def node_callback(assignment, var, value):
+        stats = search['stats'] = assignment.stats
+        if stats.nodes > node_limit:
+            raise BinaryCSP.SearchCutoff()
+    def alarm(signum, frame):
+        raise BinaryCSP.SearchCutoff()
+    previous_handler = signal.signal(signal.SIGALRM, alarm)
+    signal.setitimer(signal.ITIMER_REAL, time_limit)
+    start = time.time()
+    try:
+        solution, stats = BinaryCSP.solve(csp, value_method, variable_method, inference_method, use_ac3, \
+            returnStats=True, nodeCallback=node_callback, decompose=decompose)
+        status = 'unsat' if solution is None else 'solved'
+    except BinaryCSP.SearchCutoff:
+        stats = search.get('stats')
+        status = 'cutoff'
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+    elapsed = time.time() - start
+    result = {'instance': name, 'family': family, 'config': '%s/%s/%s' % (value_name, variable_name, inference_name), \
+        'status': status, 'time': elapsed, 'nodes': None, 'backtracks': None, 'checks': None}
+    if stats is not None:
+        result.update({'nodes': stats.nodes, 'backtracks': stats.backtracks, 'checks': stats.consistencyChecks})
+    # Read from the engine rather than stats, which only totals revisions once solve returns.
+    result['revisions'] = csp.arcConsistency.revisions
+    return result
+
+def format_count(count):
+    return '-' if count is None else str(count)
+
+""" Prints the results as a table, with the time and node ratios against a baseline run if given. """
+def print_table(results, baseline=None):
+    header = ['instance', 'config', 'status', 'nodes', 'checks', 'revisions', 'time']
+    if baseline is not None:
+        header.extend(['time x', 'nodes x'])
+    rows = []
+    for result in results:
+        row = [result['instance'], result['config'], result['status'], format_count(result['nodes']), \
+            format_count(result['checks']), format_count(result['revisions']), '%.4f' % result['time']]
+        if baseline is not None:
+            old = baseline.get((result['instance'], result['config']))
+            if old is None:
+                row.extend(['-', '-'])
+            else:
+                row.append('%.2f' % (result['time'] / old['time']) if old['time'] > 0 else '-')
+                row.append('%.2f' % (float(result['nodes']) / old['nodes']) if result['nodes'] and old['nodes'] else '-')
+        rows.append(row)
+    widths = [max(len(row[i]) for row in [header] + rows) for i in xrange(len(header))]
+    print '  '.join(header[i].ljust(widths[i]) for i in xrange(len(header)))
+    print '  '.join('-' * width for width in widths)
+    for row in rows:
+        print '  '.join(row[i].ljust(widths[i]) for i in xrange(len(row)))
+
+""" Prints the geometric mean of the time ratios of the runs solved in both this run and the baseline. """
+def print_comparison(results, baseline):
+    ratios = []
+    for result in results:
+        old = baseline.get((result['instance'], result['config']))
+        if old is not None and result['status'] != 'cutoff' and old['status'] != 'cutoff' and old['time'] > 0 and result['time'] > 0:
+            ratios.append(result['time'] / old['time'])
+    print
+    if ratios:
+        print 'Time ratio against baseline over %d runs: %.3f (geometric mean)' % \
+            (len(ratios), math.exp(sum(math.log(ratio) for ratio in ratios) / len(ratios)))
+    else:
+        print 'No runs in common with the baseline'
+
+def parse_sizes(text):
+    return [int(size) for size in text.split(',') if size]
+
+""" Parses command line arguments and runs every selected instance under every selected configuration. """
+def main():
+    parser = argparse.ArgumentParser(description='Constraint satisfaction problem benchmark')
+    parser.add_argument('-f', '--family', action='append', dest='families', choices=['csps', 'queens', 'coloring', 'sudoku'])
+    parser.add_argument('--queens', default='8,16,32,64,128,256', help='comma separated board sizes')
+    parser.add_argument('--coloring', default='20,40,60', help='comma separated numbers of vertices')
+    parser.add_argument('--sudoku', type=int, default=10, help='number of sudokus')
+    parser.add_argument('--clues', type=int, default=28, help='clues per sudoku')
+    parser.add_argument('--values', default='ord,lcv')
+    parser.add_argument('--variables', default='first,mrv')
+    parser.add_argument('--inferences', default='none,fc,mac')
+    parser.add_argument('--no-ac3', action='store_false', dest='use_ac3', help='skip the AC3 preprocessing step')
+    parser.add_argument('--no-decompose', action='store_false', dest='decompose', help='search each problem as a whole')
+    parser.add_argument('--node-limit', type=int, default=100000)
+    parser.add_argument('--time-limit', type=float, default=10.0, help='seconds per run')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='file to write the results to')
+    parser.add_argument('--compare', help='results of an earlier run, written with --json')
+    args = parser.parse_args()
+
+    families = args.families or ['csps', 'queens', 'coloring', 'sudoku']
+    configs = [(value, variable, inference) for value in valueMethods if value[0] in args.values.split(',') \
+        for variable in variableMethods if variable[0] in args.variables.split(',') \
+        for inference in inferenceMethods if inference[0] in args.inferences.split(',')]
+    instances = get_instances(families, parse_sizes(args.queens), parse_sizes(args.coloring), args.sudoku, args.clues, args.seed)
+
+    results = []
+    for name, family, factory in instances:
+        for config in configs:
+            results.append(run_benchmark(name, family, factory, config, args.use_ac3, args.node_limit, args.time_limit, args.decompose))
+            sys.stderr.write('%s %s %s\n' % (name, results[-1]['config'], results[-1]['status']))
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare) as compare_file:
+            baseline = dict(((old['instance'], old['config']), old) for old in json.load(compare_file)['results'])
+    print_table(results, baseline)
+    if baseline is not None:
+        print_comparison(results, baseline)
+    if args.json is not None:
+        with open(args.json, 'w') as json_file:
+            json.dump({'settings': vars(args), 'python': sys.version, 'results': results}, json_file, indent=1, sort_keys=True)
+
+if __name__ == '__main__':
+    main()
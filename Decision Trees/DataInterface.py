@@ -1,10 +1,396 @@
-def getConnect4Dataset(start = None, end = None):
+from array import array
+from itertools import izip
+from multiprocessing.sharedctypes import RawArray
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+class ColumnarDataset:
+  """
+  A dataset stored by column instead of as one dictionary per example. Every
+  attribute is a compact array of integer codes, one per example, and
+  attrValues[attr][code] is the value a code stands for. Labels are coded
+  against labelValues the same way. The columns are numpy uint8 arrays when
+  numpy is available and array('B') otherwise, or 16 bit codes for an attribute
+  with more than 256 values.
+
+  A dataset can also be a view of some of the examples of another: rows is then
+  a buffer of example indices shared by all views of the same columns, and the
+  view holds the examples rows[start:end]. partition splits a view into one view
+  per value of an attribute by reordering its part of the buffer in place, as in
+  quicksort, so a whole tree is built with one buffer instead of a copy of the
+  examples at every node. A view made by partition already knows its class
+  counts, so they are not counted again.
+
+  share copies a view into shared memory, so that worker processes can build
+  parts of a tree over the same columns and buffer of example indices.
+
+  dataset[i] and iterating give the examples back as dictionaries, so
+  Tree.classify and evaluateTree work on a ColumnarDataset unchanged.
+
+  attrValues (dictionary<str,list<str>>): the codebook of every attribute
+  labelName (str): the name of the label
+  labelValues (list<str>): the codebook of the label
+  columns (dictionary<str,array<int>>): the codes of every attribute
+  labels (array<int>): the codes of the label
+  rows (array<int>): the shared buffer of example indices of a view, None for all examples in order
+  """
+  def __init__(self, attrValues, labelName, labelValues, columns, labels, codes=None):
+    self.attrValues = attrValues
+    self.labelName = labelName
+    self.labelValues = labelValues
+    self.columns = columns
+    self.labels = labels
+    if codes is None:
+      codes = dict((attr, dict((value, code) for code, value in enumerate(values))) for attr, values in attrValues.items())
+    self.codes = codes
+    self.vectorized = numpy is not None and isinstance(labels, numpy.ndarray)
+    self.rows = None
+    self.start = 0
+    self.end = len(labels)
+    self.counts = None
+    self.order = None
+
+  def view(self, start=None, end=None, rows=None, counts=None, order=None):
+    """
+    Gets a view of the examples rows[start:end] of the same columns.
+
+    Args:
+      start (int): the first position of the view in rows
+      end (int): the position after the last one
+      rows (array<int>): the buffer of example indices, that of this dataset by default.
+                         A dataset that is not a view yet gets a new one with every example.
+      counts (list<int>): the class counts of the view, if known
+      order (list<int>): the label codes of the view in order of first appearance, if known
+    Returns:
+      ColumnarDataset
+      The view.
+    """
+    if rows is None:
+      rows = self.rows
+    if rows is None:
+      rows = numpy.arange(len(self), dtype=numpy.intp) if self.vectorized else array('l', xrange(len(self)))
+    view = ColumnarDataset(self.attrValues, self.labelName, self.labelValues, self.columns, self.labels, self.codes)
+    view.rows = rows
+    view.start = self.start if start is None else start
+    view.end = self.end if end is None else end
+    view.counts = counts
+    view.order = order
+    return view
+
+  def subset(self, indices):
+    """
+    Gets a view of the examples at some positions of this dataset, with a buffer
+    of example indices of its own, so partitioning it leaves this dataset as it is.
+    No column is copied.
+
+    Args:
+      indices (list<int>): positions of examples in this dataset
+    Returns:
+      ColumnarDataset
+      The view.
+    """
+    if self.rows is not None:
+      indices = [self.rows[self.start + index] for index in indices]
+    rows = numpy.array(indices, dtype=numpy.intp) if self.vectorized else array('l', indices)
+    return self.view(0, len(rows), rows=rows)
+
+  def share(self):
+    """
+    Copies the examples of this view into shared memory. The columns, the labels
+    and a new buffer of example indices are multiprocessing RawArrays, wrapped as
+    numpy arrays when numpy is available. Worker processes started afterwards
+    inherit them instead of getting a pickled copy, and see the partitions any
+    process writes to rows.
+
+    Returns:
+      ColumnarDataset
+      A view of all the examples over the shared memory.
+    """
+    def shareColumn(values):
+      shared = RawArray(columnTypecode(values), len(values))
+      if not self.vectorized:
+        shared[:] = values
+        return shared
+      values = numpy.asarray(values)
+      column = numpy.frombuffer(shared, dtype=values.dtype)
+      column[:] = values
+      return column
+    columns = dict((attr, shareColumn(self.take(values))) for attr, values in self.columns.items())
+    dataset = ColumnarDataset(self.attrValues, self.labelName, self.labelValues, columns, shareColumn(self.take(self.labels)), self.codes)
+    rows = numpy.arange(len(self), dtype=numpy.intp) if self.vectorized else array('l', xrange(len(self)))
+    return dataset.view(rows=shareColumn(rows), counts=self.counts, order=self.order)
+
+  def take(self, values):
+    """
+    Gets the entries of a column, or of labels, for the examples of this dataset.
+    """
+    if self.rows is None:
+      return values
+    if self.vectorized:
+      return values[self.rows[self.start:self.end]]
+    return array(columnTypecode(values), [values[row] for row in self.rows[self.start:self.end]])
+
+  def __len__(self):
+    return self.end - self.start
+
+  def __getitem__(self, index):
+    if self.rows is not None:
+      index = self.rows[self.start + index]
+    example = dict((attr, self.attrValues[attr][column[index]]) for attr, column in self.columns.items())
+    example[self.labelName] = self.labelValues[self.labels[index]]
+    return example
+
+  def __iter__(self):
+    for index in xrange(len(self)):
+      yield self[index]
+
+  def select(self, attrName, attrValue):
+    """
+    Gets the examples that have the value attrValue for the attribute attrName.
+
+    Returns:
+      ColumnarDataset
+      A new dataset with the same codebooks and only those examples.
+    """
+    code = self.codes[attrName].get(attrValue)
+    column = self.columns[attrName]
+    if self.vectorized:
+      mask = self.take(column) == code
+      take = lambda values: self.take(values)[mask]
+    else:
+      rows = xrange(len(self.labels)) if self.rows is None else self.rows[self.start:self.end]
+      indices = [row for row in rows if column[row] == code]
+      take = lambda values: array(columnTypecode(values), [values[row] for row in indices])
+    columns = dict((attr, take(values)) for attr, values in self.columns.items())
+    return ColumnarDataset(self.attrValues, self.labelName, self.labelValues, columns, take(self.labels), self.codes)
+
+  def classCounts(self):
+    """
+    Returns:
+      list<int>
+      The number of examples with each label, indexed by label code.
+    """
+    if self.counts is not None:
+      return list(self.counts)
+    labels = self.take(self.labels)
+    if self.vectorized:
+      return numpy.bincount(labels, minlength=len(self.labelValues)).tolist()
+    counts = [0] * len(self.labelValues)
+    for label in labels:
+      counts[label] += 1
+    return counts
+
+  def presentLabels(self, counts=None):
+    """
+    Args:
+      counts (list<int>): the result of classCounts, if already known
+    Returns:
+      list<int>
+      The codes of the labels that occur, in order of first appearance.
+    """
+    if self.order is not None:
+      return list(self.order)
+    if counts is None:
+      counts = self.classCounts()
+    codes = [code for code, count in enumerate(counts) if count > 0]
+    labels = self.take(self.labels)
+    if self.vectorized:
+      firsts = [int(numpy.argmax(labels == code)) for code in codes]
+    else:
+      firsts = [labels.index(code) for code in codes]
+    return [code for first, code in sorted(zip(firsts, codes))]
+
+  def attributeCounts(self, attrName):
+    """
+    Returns:
+      list<list<int>>
+      The number of examples with each label for each value of attrName,
+      indexed by value code and then by label code.
+    """
+    return self.contingencyTables([attrName])[attrName]
+
+  def contingencyTables(self, attrNames):
+    """
+    Gets the table of attributeCounts for several attributes, taking the labels
+    of the examples only once. Without numpy the tables are counted in a single
+    pass over the examples.
+
+    Returns:
+      dictionary<str,list<list<int>>>
+      The table of each attribute.
+    """
+    classes = len(self.labelValues)
+    labels = self.take(self.labels)
+    if self.vectorized:
+      labels = labels.astype(numpy.intp)
+      tables = {}
+      for attrName in attrNames:
+        keys = self.take(self.columns[attrName]) * classes + labels
+        tables[attrName] = numpy.bincount(keys, minlength=len(self.attrValues[attrName]) * classes).reshape(-1, classes).tolist()
+      return tables
+    tables = dict((attrName, [[0] * classes for value in self.attrValues[attrName]]) for attrName in attrNames)
+    columns = [(tables[attrName], self.columns[attrName]) for attrName in attrNames]
+    rows = xrange(len(self.labels)) if self.rows is None else self.rows[self.start:self.end]
+    for row in rows:
+      label = self.labels[row]
+      for table, column in columns:
+        table[column[row]][label] += 1
+    return tables
+
+  def partition(self, attrName):
+    """
+    Splits this view by the values of attrName. Its part of rows is reordered in
+    place so that the examples with each value are contiguous, keeping their
+    order, and every child view gets its class counts worked out here.
+
+    Returns:
+      list<ColumnarDataset>
+      A view for each value of attrName, indexed by value code.
+    """
+    if self.rows is None:
+      return self.view().partition(attrName)
+    values = len(self.attrValues[attrName])
+    classes = len(self.labelValues)
+    column = self.columns[attrName]
+    rows = self.rows[self.start:self.end]
+    if self.vectorized:
+      codes = column[rows]
+      order = numpy.argsort(codes, kind='mergesort')
+      rows[:] = rows[order]
+      codes = codes[order].astype(numpy.intp)
+      labels = self.labels[rows].astype(numpy.intp)
+      sizes = numpy.bincount(codes, minlength=values).tolist()
+      tables = numpy.bincount(codes * classes + labels, minlength=values * classes).reshape(-1, classes).tolist()
+    else:
+      buckets = [[] for value in xrange(values)]
+      for row in rows:
+        buckets[column[row]].append(row)
+      sizes = [len(bucket) for bucket in buckets]
+      self.rows[self.start:self.end] = array(columnTypecode(self.rows), [row for bucket in buckets for row in bucket])
+      labels = self.take(self.labels)
+      tables = [[0] * classes for value in xrange(values)]
+    children = []
+    start = self.start
+    for code in xrange(values):
+      end = start + sizes[code]
+      if self.vectorized:
+        block = labels[start - self.start:end - self.start]
+        present = [label for label in xrange(classes) if tables[code][label] > 0]
+        firsts = [int(numpy.argmax(block == label)) for label in present]
+        order = [label for first, label in sorted(zip(firsts, present))]
+      else:
+        order = []
+        for label in labels[start - self.start:end - self.start]:
+          if tables[code][label] == 0:
+            order.append(label)
+          tables[code][label] += 1
+      children.append(self.view(start, end, counts=tables[code], order=order))
+      start = end
+    return children
+
+def columnTypecode(values):
+  """
+  Gets the array typecode of a column, which is an array, a numpy array or a
+  RawArray made by ColumnarDataset.share.
+  """
+  if isinstance(values, array):
+    return values.typecode
+  if numpy is not None and isinstance(values, numpy.ndarray):
+    return values.dtype.char
+  return values._type_._type_
+
+def codeColumn(values, codebook):
+  """
+  Codes a sequence of values against a codebook, appending any value the
+  codebook does not have yet.
+
+  Args:
+    values (list<str>): the values of one attribute or of the label
+    codebook (list<str>): the known values, in code order
+  Returns:
+    array<int>
+    The codes, as a numpy array if numpy is available.
+  """
+  codes = dict((value, code) for code, value in enumerate(codebook))
+  try:
+    coded = map(codes.__getitem__, values)
+  except KeyError:
+    coded = []
+    for value in values:
+      if value not in codes:
+        codes[value] = len(codebook)
+        codebook.append(value)
+      coded.append(codes[value])
+  wide = len(codebook) > 256
+  if numpy is not None:
+    return numpy.array(coded, dtype=numpy.uint16 if wide else numpy.uint8)
+  return array('H' if wide else 'B', coded)
+
+def makeColumnarDataset(examples, attrValues, labelName, labelValues):
+  """
+  Converts a list of examples as dictionaries, as returned by the get*Dataset
+  functions, into a ColumnarDataset.
+
+  Args:
+    examples (list<dictionary<str,str>>): list of examples
+    attrValues (dictionary<str,list<str>>): all possible values of each attribute
+    labelName (str): the name of the label
+    labelValues (list<str>): the possible label values
+  Returns:
+    ColumnarDataset
+    The same examples stored by column.
+  """
+  attrValues = dict((attr, list(values)) for attr, values in attrValues.items())
+  labelValues = list(labelValues)
+  columns = dict((attr, codeColumn([example[attr] for example in examples], attrValues[attr])) for attr in attrValues)
+  labels = codeColumn([example[labelName] for example in examples], labelValues)
+  return ColumnarDataset(attrValues, labelName, labelValues, columns, labels)
+
+def readColumnarDataset(fileName, attrs, attrValues, labelValues, start, end):
+  """
+  Reads a comma separated dataset with the label in the last column straight
+  into a ColumnarDataset, without building a dictionary per example. Lines are
+  parsed exactly as the list loaders parse them, dropping the last character of
+  the label, so the examples are the same either way.
+
+  Args:
+    fileName (str): the file to read
+    attrs (list<str>): the names of the attribute columns, in file order
+    attrValues (dictionary<str,list<str>>): all possible values of each attribute
+    labelValues (list<str>): the possible label values
+    start (int): optional line number to start dataset at
+    end (int): optional line number to end dataset at
+  Returns:
+    tuple<ColumnarDataset,
+          dictionary<str,list<str>>,
+          str,
+          list<str>>
+
+    The dataset and, as for the other get*Dataset functions, its attribute
+    values, the name of the label and the list of possible label values.
+  """
+  rows = [line.split(',') for line in open(fileName)][start:end]
+  for row in rows:
+    if len(row) != len(attrs) + 1:
+      raise ValueError('%s: expected %d values in line %r' % (fileName, len(attrs) + 1, ','.join(row)))
+  values = zip(*rows) if rows else [()] * (len(attrs) + 1)
+  attrValues = dict((attr, list(attrValues[attr])) for attr in attrs)
+  labelValues = list(labelValues)
+  columns = dict((attr, codeColumn(values[index], attrValues[attr])) for index, attr in enumerate(attrs))
+  labels = codeColumn([label[:-1] for label in values[len(attrs)]], labelValues)
+  dataset = ColumnarDataset(attrValues, 'label', labelValues, columns, labels)
+  return (dataset, dataset.attrValues, 'label', dataset.labelValues)
+
+def getConnect4Dataset(start = None, end = None, columnar = False):
   """
   Reads in and parses through the Connect4 dataset.
   
   Args:
     start (int): optional line number to start dataset at
     end (int): optional line number to end dataset at
+    columnar (bool): whether to return the examples as a ColumnarDataset
   Returns:
     tuple<list<dictionary<str,str>>,
           dictionary<str,list<str>>,
@@ -17,13 +403,16 @@ def getConnect4Dataset(start = None, end = None):
   """
   examples=[]
   attrValues={}
-  data = open("datasets/connect4-data.txt")
   cols = ['a','b','c','d','e','f','g']
   rows = ['1','2','3','4','5','6']
   labelValues = ['win','loss','draw']
   for col in cols:
     for row in rows:
       attrValues[col+row]=['o','x','b']
+  if columnar:
+    attrs = [col+row for col in cols for row in rows]
+    return readColumnarDataset("datasets/connect4-data.txt", attrs, attrValues, labelValues, start, end)
+  data = open("datasets/connect4-data.txt")
   for line in data:
     dict = {}
     examples.append(dict)
@@ -42,13 +431,14 @@ def getConnect4Dataset(start = None, end = None):
     examples = examples[start:end]
   return (examples,attrValues,'label',labelValues)
 
-def getCarDataset(start = None, end = None):
+def getCarDataset(start = None, end = None, columnar = False):
   """
   Reads in and parses through the Car dataset.
   
   Args:
       start (int): optional line number to start dataset at
       end (int): optional line number to end dataset at
+      columnar (bool): whether to return the examples as a ColumnarDataset
   Returns:
     tuple<list<dictionary<str,str>>,
           dictionary<str,list<str>>,
@@ -61,7 +451,6 @@ def getCarDataset(start = None, end = None):
   """
   examples=[]
   attrValues={}
-  data = open("datasets/cars-data.txt")
   attrs = ['buying','maint','doors','persons','lug_boot','safety']
   attr_values = [['vhigh', 'high', 'med', 'low'],
                  ['vhigh', 'high', 'med', 'low'],
@@ -72,6 +461,9 @@ def getCarDataset(start = None, end = None):
   labelValues = ['unacc','acc','good','vgood']
   for index in range(len(attrs)):
     attrValues[attrs[index]]=attr_values[index]
+  if columnar:
+    return readColumnarDataset("datasets/cars-data.txt", attrs, attrValues, labelValues, start, end)
+  data = open("datasets/cars-data.txt")
   for line in data:
     dict = {}
     examples.append(dict)
@@ -277,13 +669,14 @@ data2TrainingExamples = [[1,1,1,1,0,1,1,1,0,1],
 
 data2TestLabels = [1,0,0,0,1,0,0,0,0,0,0,0,1,1,1,1,1,1,1,1]
 
-def getExtraCreditDataset(start = None, end = None):
+def getExtraCreditDataset(start = None, end = None, columnar = False):
   """
   Reads in and parses through the Car dataset.
   
   Args:
       start (int): optional line number to start dataset at
       end (int): optional line number to end dataset at
+      columnar (bool): whether to return the examples as a ColumnarDataset
   Returns:
     tuple<list<dictionary<str,str>>,
           dictionary<str,list<str>>,
@@ -296,7 +689,6 @@ def getExtraCreditDataset(start = None, end = None):
   """
   examples=[]
   attrValues={}
-  data = open("datasets/extracredit-data2.txt")
   attrs = ['temperature_of_patient','occurrence_nausea','lumbar_pain','urine_pushing','micturition_pains','burning']
   attr_values = [['36', '37', '38', '39', '40', '41', '42'],
                  ['yes', 'no'],
@@ -307,6 +699,9 @@ def getExtraCreditDataset(start = None, end = None):
   labelValues = ['yes', 'no']
   for index in range(len(attrs)):
     attrValues[attrs[index]]=attr_values[index]
+  if columnar:
+    return readColumnarDataset("datasets/extracredit-data2.txt", attrs, attrValues, labelValues, start, end)
+  data = open("datasets/extracredit-data2.txt")
   for line in data:
     dict = {}
     examples.append(dict)
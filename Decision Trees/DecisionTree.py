@@ -1,5 +1,7 @@
 from math import log
+import multiprocessing
 from scipy.stats import chisqprob
+from DataInterface import ColumnarDataset, makeColumnarDataset
 
 class Node:
   """
@@ -91,13 +93,15 @@ def getPertinentExamples(examples,attrName,attrValue):
     attrValue for the attribute with the name attrName.
     
     Args:
-        examples (list<dictionary<str,str>>): list of examples
+        examples (list<dictionary<str,str>> or ColumnarDataset): list of examples
         attrName (str): the name of the attribute to get counts for
         attrValue (str): a value of the attribute
     Returns:
-        list<dictionary<str,str>>
+        list<dictionary<str,str>> or ColumnarDataset
         The new list of examples.
     """
+    if isinstance(examples, ColumnarDataset):
+        return examples.select(attrName, attrValue)
     newExamples = []
     for i in examples:
         if i[attrName] == attrValue:
@@ -114,7 +118,7 @@ def getClassCounts(examples,className):
     occurs.
     
     Args:
-        examples (list<dictionary<str,str>>): list of examples
+        examples (list<dictionary<str,str>> or ColumnarDataset): list of examples
         className (str): the name of the class
     Returns:
         dictionary<string,int>
@@ -122,6 +126,13 @@ def getClassCounts(examples,className):
         of that class value in the examples. That is, it maps the class value
         to its count.
     """
+    if isinstance(examples, ColumnarDataset):
+        # Filled in order of first appearance like the loop below, so that ties in getMostCommonClass break the same way.
+        counts = examples.classCounts()
+        classCounts = {}
+        for code in examples.presentLabels(counts):
+            classCounts[examples.labelValues[code]] = counts[code]
+        return classCounts
     classCounts = {}
     for i in examples:
         label = i[className]
@@ -149,7 +160,7 @@ def getAttributeCounts(examples,attrName,attrValues,className):
  	  that have that assignment of that attribute.
     
     Args:
-        examples (list<dictionary<str,str>>): list of examples
+        examples (list<dictionary<str,str>> or ColumnarDataset): list of examples
         attrName (str): the name of the attribute to get counts for
         attrValues (list<str>): list of possible values for the attribute
         className (str): the name of the class
@@ -162,18 +173,104 @@ def getAttributeCounts(examples,attrName,attrValues,className):
     for value in attrValues:
         attributeCounts[value] = {}
 
+    if isinstance(examples, ColumnarDataset):
+        table = examples.attributeCounts(attrName)
+        for code, value in enumerate(examples.attrValues[attrName]):
+            attributeCounts[value] = dict((examples.labelValues[label], count) for label, count in enumerate(table[code]) if count > 0)
+        return attributeCounts
+
     for i in examples:
         #print(i)
         #print(attributeCounts)
         attrlabel = i[attrName]
-        classlabel = i['label']
+        classlabel = i[className]
         if classlabel not in attributeCounts[attrlabel].keys():
             attributeCounts[attrlabel][classlabel] = 1
         else:
             attributeCounts[attrlabel][classlabel] = attributeCounts[attrlabel][classlabel] + 1
     #print(attributeCounts)
     return attributeCounts
-        
+
+def getContingencyTables(examples,attrNames,attributeValues,className):
+    """
+    Gets the table of getAttributeCounts for several attributes at once, in a
+    single pass over the examples instead of one pass per attribute and value.
+    For a ColumnarDataset every table is counted by one vectorized bincount.
+    
+    Args:
+        examples (list<dictionary<str,str>> or ColumnarDataset): list of examples
+        attrNames (list<str>): the names of the attributes to get counts for
+        attributeValues (dictionary<str,list<str>>): list of possible values for each attribute
+        className (str): the name of the class
+    Returns:
+        dictionary<str,dictionary<str,dictionary<str,int>>>
+        This is a dictionary from each attribute name to its table, as returned
+        by getAttributeCounts
+    """
+    if isinstance(examples, ColumnarDataset):
+        tables = {}
+        for attrName, table in examples.contingencyTables(attrNames).items():
+            tables[attrName] = dict((value, {}) for value in attributeValues[attrName])
+            for code, value in enumerate(examples.attrValues[attrName]):
+                tables[attrName][value] = dict((examples.labelValues[label], count) for label, count in enumerate(table[code]) if count > 0)
+        return tables
+    tables = {}
+    for attrName in attrNames:
+        tables[attrName] = dict((value, {}) for value in attributeValues[attrName])
+    for example in examples:
+        classlabel = example[className]
+        for attrName in attrNames:
+            counts = tables[attrName][example[attrName]]
+            counts[classlabel] = counts.get(classlabel, 0) + 1
+    return tables
+
+def getCountTables(examples,attrNames,attributeValues,className):
+    """
+    Gets the contingency tables of several attributes as plain counts, the form
+    the FromCounts functions score: a list with the class counts for each value
+    of the attribute. For a ColumnarDataset these are the bincount tables of
+    ColumnarDataset.contingencyTables as they are, indexed by value and label code.
+    
+    Args:
+        examples (list<dictionary<str,str>> or ColumnarDataset): list of examples
+        attrNames (list<str>): the names of the attributes to get counts for
+        attributeValues (dictionary<str,list<str>>): list of possible values for each attribute
+        className (str): the name of the class
+    Returns:
+        dictionary<str,list<list<int>>>
+        This is a dictionary from each attribute name to its table of counts
+    """
+    if isinstance(examples, ColumnarDataset):
+        return examples.contingencyTables(attrNames)
+    tables = getContingencyTables(examples, attrNames, attributeValues, className)
+    return dict((attrName, [counts.values() for counts in table.values()]) for attrName, table in tables.items())
+
+
+def partitionExamples(examples,attrName,attrValues):
+    """
+    Splits the examples by their value of attrName, as getPertinentExamples
+    would for each value. A view of a ColumnarDataset is partitioned in place,
+    so the children share its buffer of example indices and come with their
+    class counts. A list is split into new lists in one pass.
+    
+    Args:
+        examples (list<dictionary<str,str>> or ColumnarDataset): list of examples
+        attrName (str): the name of the attribute to split by
+        attrValues (list<str>): list of possible values for the attribute
+    Returns:
+        dictionary<str,list<dictionary<str,str>> or ColumnarDataset>
+        The examples with each value of the attribute.
+    """
+    if isinstance(examples, ColumnarDataset):
+        children = examples.partition(attrName)
+        partitions = dict(zip(examples.attrValues[attrName], children))
+        empty = examples.view(examples.start, examples.start, counts=[0] * len(examples.labelValues), order=[])
+        return dict((value, partitions.get(value, empty)) for value in attrValues)
+    partitions = dict((value, []) for value in attrValues)
+    for example in examples:
+        if example[attrName] in partitions:
+            partitions[example[attrName]].append(example)
+    return partitions
 
 def setEntropy(classCounts):
     """
@@ -214,13 +311,27 @@ def remainder(examples,attrName,attrValues,className):
         The remainder score of this value assignment of the attribute.
     """
     
+    attributeCounts = getAttributeCounts(examples, attrName, attrValues, className)
+    return remainderFromCounts(getClassCounts(examples, className).values(), [counts.values() for counts in attributeCounts.values()])
+
+def remainderFromCounts(classCounts,attributeCounts):
+    """
+    Calculates the remainder from the class counts of a set of examples and the
+    counts of an attribute, as in getCountTables, without going over the examples.
+    
+    Args:
+        classCounts (list<int>): list of counts of each class value
+        attributeCounts (list<list<int>>): the class counts for each value of the attribute
+    Returns:
+        float
+        The remainder score of this value assignment of the attribute.
+    """
     remainder = 0
-    classCounts = getClassCounts(examples, className)
-    total = float(sum(classCounts.values()))
-    for i in attrValues:
-        pertinentExamples = getPertinentExamples(examples,attrName,i)
-        pertinentExamplesCounts = getClassCounts(pertinentExamples, className)
-        remainder += (sum(pertinentExamplesCounts.values())/total) * setEntropy(pertinentExamplesCounts.values())
+    total = float(sum(classCounts))
+    for pertinentExamplesCounts in attributeCounts:
+        pertinentCount = sum(pertinentExamplesCounts)
+        if pertinentCount > 0:
+            remainder += (pertinentCount/total) * setEntropy([count for count in pertinentExamplesCounts if count > 0])
     return remainder
 
           
@@ -239,7 +350,14 @@ def infoGain(examples,attrName,attrValues,className):
         float
         The gain score of this value assignment of the attribute.
     """
-    infoGain = setEntropy(getClassCounts(examples, className).values()) - remainder(examples, attrName, attrValues, className)
+    attributeCounts = getAttributeCounts(examples, attrName, attrValues, className)
+    return infoGainFromCounts(getClassCounts(examples, className).values(), [counts.values() for counts in attributeCounts.values()])
+
+def infoGainFromCounts(classCounts,attributeCounts):
+    """
+    Calculates the info gain from counts, as in remainderFromCounts.
+    """
+    infoGain = setEntropy([count for count in classCounts if count > 0]) - remainderFromCounts(classCounts, attributeCounts)
     return infoGain
   
 def giniIndex(classCounts):
@@ -276,37 +394,120 @@ def giniGain(examples,attrName,attrValues,className):
         float
         The summed gini index score of this list of class value counts.
     """
+    attributeCounts = getAttributeCounts(examples, attrName, attrValues, className)
+    return giniGainFromCounts(getClassCounts(examples, className).values(), [counts.values() for counts in attributeCounts.values()])
+
+def giniGainFromCounts(classCounts,attributeCounts):
+    """
+    Calculates the inverse gini gain from counts, as in remainderFromCounts.
+    """
     giniGain = 0
-    for i in attrValues:
-        pertinentExamples = getPertinentExamples(examples,attrName,i)
-        pertinentExamplesCounts = getClassCounts(pertinentExamples, className)
-        giniGain += len(pertinentExamples)/float(len(examples)) * giniIndex(pertinentExamplesCounts.values())
+    total = float(sum(classCounts))
+    for pertinentExamplesCounts in attributeCounts:
+        pertinentCount = sum(pertinentExamplesCounts)
+        if pertinentCount > 0:
+            giniGain += pertinentCount/total * giniIndex(pertinentExamplesCounts)
     
     if giniGain == 0.0:
         import sys
         return sys.maxint
     else: 
         return 1/giniGain 
+
+"""
+Maps the gain functions above to their versions working on counts.
+"""
+countGainFuncs = {infoGain: infoGainFromCounts, giniGain: giniGainFromCounts}
+
+def chooseAttribute(remainingAttributes,examples,attributeValues,className,gainFunc,classCounts=None,tables=None):
+    """
+    Finds the attribute with the highest gain, the first one on ties. For infoGain
+    and giniGain the tables of all remaining attributes are counted at once with
+    getCountTables and scored from the counts. Any other gainFunc is called on the
+    examples for each attribute.
+    
+    Args:
+        remainingAttributes (list<string>): the names of attributes still not used
+        examples (list<dictionary<str,str>> or ColumnarDataset): list of examples
+        attributeValues (dictionary<string,list<string>>): list of possible values for attribute
+        className (str): the name of the class
+        gainFunc (func): the function to score gain of attributes (ie infoGain or giniGain)
+        classCounts (list<int>): the counts of each class value in the examples, if already known
+        tables (dictionary<str,list<list<int>>>): the getCountTables of the examples for
+            remainingAttributes, if already known
+    Returns:
+        str
+        The name of the best attribute.
+    """
+    countGainFunc = countGainFuncs.get(gainFunc)
+    if countGainFunc is not None:
+        if classCounts is None:
+            classCounts = getClassCounts(examples, className).values()
+        if tables is None:
+            tables = getCountTables(examples, remainingAttributes, attributeValues, className)
+    maxGain = 0
+    bestAttrName = remainingAttributes[0]
+    for attrName in remainingAttributes:
+        if countGainFunc is None:
+            gain = gainFunc(examples,attrName,attributeValues[attrName],className)
+        else:
+            gain = countGainFunc(classCounts, tables[attrName])
+        if gain > maxGain:
+            maxGain = gain
+            bestAttrName = attrName
+    return bestAttrName
     
-def makeTree(examples, attrValues,className,setScoreFunc,gainFunc):
+def getTrainingView(examples,attrValues,className,gainFunc):
+    """
+    Gets the examples in the form makeSubtrees works on best. For infoGain and
+    giniGain that is a view of a ColumnarDataset, which partitionExamples splits
+    in place, so the whole tree is built over one buffer of example indices
+    instead of a new list of examples at every node. A list of examples is
+    converted first. Any other gainFunc gets the examples as they are.
+    
+    Args:
+        examples (list<dictionary<str,str>> or ColumnarDataset): list of examples
+        attrValues (dictionary<string,list<string>>): list of possible values for attribute
+        className (str): the name of the class
+        gainFunc (func): the function to score gain of attributes (ie infoGain or giniGain)
+    Returns:
+        list<dictionary<str,str>> or ColumnarDataset
+        The examples to build the tree from.
+    """
+    if gainFunc not in countGainFuncs:
+        return examples
+    if not isinstance(examples, ColumnarDataset):
+        examples = makeColumnarDataset(examples, attrValues, className, [])
+    return examples.view()
+
+def makeTree(examples, attrValues,className,setScoreFunc,gainFunc,workers=0,parallelSize=2000):
     """
     Creates the classification tree for the given examples. Note that this is implemented - you
     just need to imeplement makeSubtrees.
     
     Args:
-        examples (list<dictionary<str,str>>): list of examples
+        examples (list<dictionary<str,str>> or ColumnarDataset): list of examples
         attrValues (dictionary<string,list<string>>): list of possible values for attribute
         className (str): the name of the class
         classScoreFunc (func): the function to score classes (ie setEntropy or giniIndex)
         gainFunc (func): the function to score gain of attributes (ie infoGain or giniGain)
+        workers (int): number of worker processes, see ParallelBuild and getWorkerCount. 0 builds
+            the tree in this process, as does any gainFunc other than infoGain and giniGain.
+        parallelSize (int): the smallest subtree handed to a worker process
     Returns:
         Tree
         The classification tree for this set of examples
     """
     remainingAttributes=attrValues.keys()
-    return Tree(makeSubtrees(remainingAttributes,examples,attrValues,className,getMostCommonClass(examples,className),setScoreFunc,gainFunc))
+    examples = getTrainingView(examples,attrValues,className,gainFunc)
+    defaultLabel = getMostCommonClass(examples,className)
+    workers = getWorkerCount(workers)
+    if workers > 0 and isinstance(examples, ColumnarDataset):
+        build = ParallelBuild(examples.share(),attrValues,className,setScoreFunc,gainFunc,None,workers,parallelSize)
+        return Tree(build.build(remainingAttributes,defaultLabel))
+    return Tree(makeSubtrees(remainingAttributes,examples,attrValues,className,defaultLabel,setScoreFunc,gainFunc))
     
-def makeSubtrees(remainingAttributes,examples,attributeValues,className,defaultLabel,setScoreFunc,gainFunc):
+def makeSubtrees(remainingAttributes,examples,attributeValues,className,defaultLabel,setScoreFunc,gainFunc,parallel=None):
     """
     Creates a classification tree Node and all its children. This returns a Node, which is the root
     Node of the tree constructed from the passed in parameters. This should be implemented recursively,
@@ -314,12 +515,13 @@ def makeSubtrees(remainingAttributes,examples,attributeValues,className,defaultL
 
     Args:
         remainingAttributes (list<string>): the names of attributes still not used
-        examples (list<dictionary<str,str>>): list of examples
+        examples (list<dictionary<str,str>> or ColumnarDataset): list of examples, a view for infoGain and giniGain
         attrValues (dictionary<string,list<string>>): list of possible values for attribute
         className (str): the name of the class
         defaultLabel (string): the default label
         setScoreFunc (func): the function to score classes (ie setEntropy or giniIndex)
         gainFunc (func): the function to score gain of attributes (ie infoGain or giniGain)
+        parallel (ParallelBuild): the parallel build this node is part of, None for a serial build
     Returns:
         Node or LeafNode
         The classification tree node optimal for the remaining set of attributes.
@@ -332,63 +534,70 @@ def makeSubtrees(remainingAttributes,examples,attributeValues,className,defaultL
         #print("edge case 1")
         root = LeafNode(defaultLabel)
         return root
-    elif len(getClassCounts(examples,className).keys()) == 1:
+    classCounts = getClassCounts(examples,className)
+    if len(classCounts.keys()) == 1:
         #print("edge case 2")
-        #print(getClassCounts(examples, className).keys())
-        root = LeafNode(getClassCounts(examples, className).keys()[0])
+        root = LeafNode(classCounts.keys()[0])
         return root
     elif len(remainingAttributes) == 0:
         #print("edge case 3")
-        #print(getMostCommonClass(examples,className))
-        root = LeafNode(getMostCommonClass(examples,className))
-        root.value = getMostCommonClass(examples,className)
+        root = LeafNode(max(classCounts, key=classCounts.get))
         return root
     elif len(examples)!= 0 and len(remainingAttributes) != 0:
-        maxGain = 0
-        bestAttrName = remainingAttributes[0]
-        for attrName in remainingAttributes:
-            gain = gainFunc(examples,attrName,attributeValues[attrName],className)
-            if gain > maxGain:
-                maxGain = gain
-                bestAttrName = attrName
+        if parallel is None:
+            bestAttrName = chooseAttribute(remainingAttributes, examples, attributeValues, className, gainFunc, classCounts.values())
+        else:
+            bestAttrName = parallel.chooseAttribute(remainingAttributes, examples, classCounts.values())
         #print("bestAttrName", bestAttrName)
         root = Node(bestAttrName)
-        mostCommonClass = getMostCommonClass(examples,className)
+        mostCommonClass = max(classCounts, key=classCounts.get)
         #print("list", remainingAttributes)
         #print("to remove", bestAttrName)
         newRemainingAttributes = list(remainingAttributes)
         newRemainingAttributes.remove(bestAttrName)
         #print("list after", remainingAttributes)
         #print("attributeValues[bestAttrName]", attributeValues[bestAttrName])
+        partitions = partitionExamples(examples, bestAttrName, attributeValues[bestAttrName])
         for attrValue in attributeValues[bestAttrName]:
             #print("attrValue", attrValue)
-            pertinentExamples = getPertinentExamples(examples, bestAttrName, attrValue)
+            pertinentExamples = partitions[attrValue]
             #if len(pertinentExamples) != 0:
+            if parallel is not None:
+                parallel.addSubtree(root, attrValue, newRemainingAttributes, pertinentExamples, mostCommonClass)
+                continue
             child = makeSubtrees(newRemainingAttributes, pertinentExamples, attributeValues, className, mostCommonClass, setScoreFunc, gainFunc)
             root.children[attrValue] = child
         return root
 
 
-def makePrunedTree(examples, attrValues,className,setScoreFunc,gainFunc,q):
+def makePrunedTree(examples, attrValues,className,setScoreFunc,gainFunc,q,workers=0,parallelSize=2000):
     """
     Creates the classification tree for the given examples. Note that this is implemented - you
     just need to imeplement makeSubtrees.
     
     Args:
-        examples (list<dictionary<str,str>>): list of examples
+        examples (list<dictionary<str,str>> or ColumnarDataset): list of examples
         attrValues (dictionary<string,list<string>>): list of possible values for attribute
         className (str): the name of the class
         classScoreFunc (func): the function to score classes (ie setEntropy or giniIndex)
         gainFunc (func): the function to score gain of attributes (ie infoGain or giniGain)
         q (float): the Chi-Squared pruning parameter
+        workers (int): number of worker processes, as for makeTree
+        parallelSize (int): the smallest subtree handed to a worker process
     Returns:
         Tree
         The classification tree for this set of examples
     """
     remainingAttributes=attrValues.keys()
-    return Tree(makePrunedSubtrees(remainingAttributes,examples,attrValues,className,getMostCommonClass(examples,className),setScoreFunc,gainFunc,q))
+    examples = getTrainingView(examples,attrValues,className,gainFunc)
+    defaultLabel = getMostCommonClass(examples,className)
+    workers = getWorkerCount(workers)
+    if workers > 0 and isinstance(examples, ColumnarDataset):
+        build = ParallelBuild(examples.share(),attrValues,className,setScoreFunc,gainFunc,q,workers,parallelSize)
+        return Tree(build.build(remainingAttributes,defaultLabel))
+    return Tree(makePrunedSubtrees(remainingAttributes,examples,attrValues,className,defaultLabel,setScoreFunc,gainFunc,q))
     
-def makePrunedSubtrees(remainingAttributes,examples,attributeValues,className,defaultLabel,setScoreFunc,gainFunc,q):
+def makePrunedSubtrees(remainingAttributes,examples,attributeValues,className,defaultLabel,setScoreFunc,gainFunc,q,parallel=None):
     """
     Creates a classification tree Node and all its children. This returns a Node, which is the root
     Node of the tree constructed from the passed in parameters. This should be implemented recursively,
@@ -396,13 +605,14 @@ def makePrunedSubtrees(remainingAttributes,examples,attributeValues,className,de
 
     Args:
         remainingAttributes (list<string>): the names of attributes still not used
-        examples (list<dictionary<str,str>>): list of examples
+        examples (list<dictionary<str,str>> or ColumnarDataset): list of examples, a view for infoGain and giniGain
         attrValues (dictionary<string,list<string>>): list of possible values for attribute
         className (str): the name of the class
         defaultLabel (string): the default label
         setScoreFunc (func): the function to score classes (ie classEntropy or gini)
         gainFunc (func): the function to score gain of attributes (ie entropyGain or giniGain)
         q (float): the Chi-Squared pruning parameter
+        parallel (ParallelBuild): the parallel build this node is part of, None for a serial build
     Returns:
         Node or LeafNode
         The classification tree node optimal for the remaining set of attributes.
@@ -416,31 +626,28 @@ def makePrunedSubtrees(remainingAttributes,examples,attributeValues,className,de
     if len(examples) == 0:
         root = LeafNode(defaultLabel)
         return root
-    elif len(getClassCounts(examples,className).keys()) == 1:
-        root = LeafNode(getClassCounts(examples, className).keys()[0])
+    elif len(classCounts.keys()) == 1:
+        root = LeafNode(classCounts.keys()[0])
         return root
     elif len(remainingAttributes) == 0:
-        root = LeafNode(getMostCommonClass(examples,className))
-        root.value = getMostCommonClass(examples,className)
+        root = LeafNode(max(classCounts, key=classCounts.get))
         return root
     elif len(examples)!= 0 and len(remainingAttributes) != 0:
-        maxGain = 0
-        bestAttrName = remainingAttributes[0]
-        for attrName in remainingAttributes:
-            gain = gainFunc(examples,attrName,attributeValues[attrName],className)
-            if gain > maxGain:
-                maxGain = gain
-                bestAttrName = attrName
+        if parallel is None:
+            bestAttrName = chooseAttribute(remainingAttributes, examples, attributeValues, className, gainFunc, classCounts.values())
+        else:
+            bestAttrName = parallel.chooseAttribute(remainingAttributes, examples, classCounts.values())
+        table = getAttributeCounts(examples, bestAttrName, attributeValues[bestAttrName], className)
         deviation = 0.0
         for attrValue in attributeValues[bestAttrName]:
             #print("attrValue", attrValue)
             expectedPertinentClassCounts = {}
-            pertinentExamples = getPertinentExamples(examples, bestAttrName, attrValue)
-            if len(pertinentExamples) > 0:
-                pertinentClassCounts = getClassCounts(pertinentExamples, className)
+            pertinentClassCounts = table[attrValue]
+            pertinentCount = sum(pertinentClassCounts.values())
+            if pertinentCount > 0:
                 # print("pertinentClassCounts", pertinentClassCounts)
                 for classes in classRatios.keys():
-                    expectedPertinentClassCounts[classes] = classRatios[classes] * len(pertinentExamples)
+                    expectedPertinentClassCounts[classes] = classRatios[classes] * pertinentCount
 
                 for label in expectedPertinentClassCounts.keys():
                     #print("expectedPertinentClassCounts[label]", label, expectedPertinentClassCounts[label])
@@ -453,21 +660,165 @@ def makePrunedSubtrees(remainingAttributes,examples,attributeValues,className,de
         dof = (len(attributeValues[bestAttrName]) - 1) * (len(classCounts.keys()) - 1)
         p = chisqprob(deviation, df = dof)
         #print("p, q", deviation, dof, p, q)
+        mostCommonClass = max(classCounts, key=classCounts.get)
         if p > q:
-            root = LeafNode(getMostCommonClass(examples,className))
+            root = LeafNode(mostCommonClass)
             return root
         else:
             root = Node(bestAttrName)
             newRemainingAttributes = list(remainingAttributes)
             newRemainingAttributes.remove(bestAttrName)
-            mostCommonClass = getMostCommonClass(examples,className)
+            partitions = partitionExamples(examples, bestAttrName, attributeValues[bestAttrName])
             for attrValue in attributeValues[bestAttrName]:
                 #print("attrValue", attrValue)
-                pertinentExamples = getPertinentExamples(examples, bestAttrName, attrValue)
+                pertinentExamples = partitions[attrValue]
                 #if len(pertinentExamples) != 0:
+                if parallel is not None:
+                    parallel.addSubtree(root, attrValue, newRemainingAttributes, pertinentExamples, mostCommonClass)
+                    continue
                 child = makePrunedSubtrees(newRemainingAttributes, pertinentExamples, attributeValues, className, mostCommonClass, setScoreFunc, gainFunc, q)
                 root.children[attrValue] = child
             return root
 
 
     
+
+"""
+The training view and the arguments common to every subtree in a worker process
+of a ParallelBuild, as a tuple (examples, attributeValues, className, setScoreFunc,
+gainFunc, q). Set by startTreeWorker.
+"""
+treeWorkerState = None
+
+def startTreeWorker(examples,attributeValues,className,setScoreFunc,gainFunc,q):
+    """
+    Initializes a worker process of a ParallelBuild. The examples are a view over
+    shared memory made by ColumnarDataset.share, inherited by the process rather
+    than pickled.
+    """
+    global treeWorkerState
+    treeWorkerState = (examples, attributeValues, className, setScoreFunc, gainFunc, q)
+
+def getWorkerCount(workers):
+    """
+    Caps the number of worker processes of a ParallelBuild at the number of CPUs.
+    With fewer than two left there is nothing to gain over a serial build, so 0
+    is returned.
+    """
+    workers = min(workers, multiprocessing.cpu_count())
+    return workers if workers > 1 else 0
+
+def contingencyWorker(job):
+    """
+    Counts the tables of some of the attributes for the examples rows[start:end] of
+    the shared view, as the lists of integer counts of getCountTables.
+    """
+    start, end, attrNames = job
+    examples = treeWorkerState[0]
+    return examples.view(start, end).contingencyTables(attrNames)
+
+def subtreeWorker(job):
+    """
+    Builds the subtree of the examples rows[start:end] of the shared view, partitioning
+    that part of rows in place like a serial build.
+    """
+    index, remainingAttributes, start, end, counts, order, defaultLabel = job
+    examples, attributeValues, className, setScoreFunc, gainFunc, q = treeWorkerState
+    examples = examples.view(start, end, counts=counts, order=order)
+    if q is None:
+        return index, makeSubtrees(remainingAttributes, examples, attributeValues, className, defaultLabel, setScoreFunc, gainFunc)
+    return index, makePrunedSubtrees(remainingAttributes, examples, attributeValues, className, defaultLabel, setScoreFunc, gainFunc, q)
+
+class ParallelBuild:
+    """
+    Builds a tree on a pool of worker processes sharing the training examples. A
+    node with at least workers * parallelSize examples is large: it is built in this
+    process, with the contingency tables of its candidate attributes counted by the
+    workers, one group of attributes each. The subtrees below the large nodes with
+    at least parallelSize examples are handed to the workers once the large nodes
+    are done, biggest first, and smaller ones are built here on the way.
+
+    Every node is built by makeSubtrees or makePrunedSubtrees over the same shared
+    view, partitioned the same way, so the tree is identical to a serial build. The
+    parts of rows being partitioned by different processes never overlap.
+
+    This is not faster by default. Measured on connect4 with infoGain, starting a
+    pool of 4 workers takes about 0.15s, where a serial build of 20000 examples
+    takes 0.6s. Sending a subtree of 2000 examples back costs about 2% of its build
+    time, and counting the tables of a large node on the pool only saves time from
+    a few thousand examples on. A parallel build can only pay off with that many
+    idle CPUs and a tree that takes seconds to build serially. On one CPU it is
+    always slower, which is why getWorkerCount falls back to a serial build there.
+
+    examples (ColumnarDataset): the training view, made by ColumnarDataset.share
+    q (float): the Chi-Squared pruning parameter, None for a tree without pruning
+    workers (int): number of worker processes
+    parallelSize (int): the smallest subtree handed to a worker process
+    pending (list<tuple<Node,str,tuple>>): the subtrees left to the workers, as the
+        node and value they are a child for and the arguments of subtreeWorker
+    """
+    def __init__(self,examples,attributeValues,className,setScoreFunc,gainFunc,q,workers,parallelSize):
+        self.examples = examples
+        self.attributeValues = attributeValues
+        self.className = className
+        self.setScoreFunc = setScoreFunc
+        self.gainFunc = gainFunc
+        self.q = q
+        self.workers = workers
+        self.parallelSize = parallelSize
+        self.pending = []
+        self.pool = None
+
+    def isLarge(self,examples):
+        return len(examples) >= self.workers * self.parallelSize
+
+    def makeSubtrees(self,remainingAttributes,examples,defaultLabel,parallel):
+        if self.q is None:
+            return makeSubtrees(remainingAttributes, examples, self.attributeValues, self.className, defaultLabel, self.setScoreFunc, self.gainFunc, parallel)
+        return makePrunedSubtrees(remainingAttributes, examples, self.attributeValues, self.className, defaultLabel, self.setScoreFunc, self.gainFunc, self.q, parallel)
+
+    def chooseAttribute(self,remainingAttributes,examples,classCounts):
+        """
+        chooseAttribute for a node of this build, with the contingency tables counted
+        by the workers if the node is large.
+        """
+        tables = None
+        if self.isLarge(examples):
+            jobs = [(examples.start, examples.end, remainingAttributes[i::self.workers]) for i in xrange(min(self.workers, len(remainingAttributes)))]
+            tables = {}
+            for chunkTables in self.pool.map(contingencyWorker, jobs):
+                tables.update(chunkTables)
+        return chooseAttribute(remainingAttributes, examples, self.attributeValues, self.className, self.gainFunc, classCounts, tables)
+
+    def addSubtree(self,root,attrValue,remainingAttributes,examples,defaultLabel):
+        """
+        Builds the child of root for attrValue here if it is large or small, or leaves
+        it to the workers.
+        """
+        if self.isLarge(examples):
+            root.children[attrValue] = self.makeSubtrees(remainingAttributes, examples, defaultLabel, self)
+        elif len(examples) >= self.parallelSize:
+            job = (remainingAttributes, examples.start, examples.end, examples.counts, examples.order, defaultLabel)
+            self.pending.append((root, attrValue, job))
+        else:
+            root.children[attrValue] = self.makeSubtrees(remainingAttributes, examples, defaultLabel, None)
+
+    def build(self,remainingAttributes,defaultLabel):
+        """
+        Returns:
+            Node or LeafNode
+            The root of the tree of all the examples.
+        """
+        self.pool = multiprocessing.Pool(self.workers, startTreeWorker, \
+            (self.examples, self.attributeValues, self.className, self.setScoreFunc, self.gainFunc, self.q))
+        try:
+            root = self.makeSubtrees(remainingAttributes, self.examples, defaultLabel, self)
+            jobs = [(index,) + job for index, (node, attrValue, job) in enumerate(self.pending)]
+            jobs.sort(key=lambda job: job[2] - job[3])
+            for index, subtree in self.pool.imap_unordered(subtreeWorker, jobs):
+                node, attrValue, job = self.pending[index]
+                node.children[attrValue] = subtree
+        finally:
+            self.pool.terminate()
+            self.pool.join()
+        return root
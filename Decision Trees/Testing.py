@@ -1,30 +1,160 @@
 from DataInterface import getDummyDataset2,getDummyDataset1,getConnect4Dataset, getCarDataset, getExtraCreditDataset
-from DecisionTree import makeTree, setEntropy,infoGain
+from DataInterface import ColumnarDataset, makeColumnarDataset
+import DataInterface
+from DecisionTree import makeTree, makePrunedTree, setEntropy,infoGain, getClassCounts, getCountTables, countGainFuncs
+from DecisionTree import Tree, ParallelBuild, getTrainingView, getMostCommonClass
+import multiprocessing
 import random
+import time
 
-def getAverageClassificaionRate(dataset,runs=20,testSize=200,setFunc = setEntropy, infoFunc = infoGain):
+def getAverageClassificaionRate(dataset,runs=20,testSize=200,setFunc = setEntropy, infoFunc = infoGain, seed = None, workers = 0):
     """
-    Randomly selects a test set and removes it from the training set.
+    Randomly selects a test set and removes it from the training set, with
+    repeatedHoldout. See repeatedHoldout for seed and workers, though the runs
+    are done in this process unless workers is given.
     """
-    scores = []
     examples,attrValues,labelName,labelValues = dataset
     l = len(examples)-1
     print("length",
      l)
     print 'Starting test for average error for %d runs with test size %d'%(runs,testSize)
+    results = repeatedHoldout(dataset, runs, testSize, setFunc, infoFunc, seed, workers)
+    scores = [result['accuracy'] for result in results]
     for r in xrange(runs):
-        runExamples = examples[:]
-        test = []
-        for i in xrange(testSize):
-            test.append(runExamples.pop(random.randint(0,l-i)))
-        tree = makeTree(runExamples, attrValues, labelName, setFunc, infoFunc)
-        score = evaluateTree(tree,test,labelName)[0]
-        print 'Score for run %d is %f'%(r+1,score)
-        scores.append(score)
+        print 'Score for run %d is %f'%(r+1,scores[r])
     average = sum(scores)/float(runs)
     print 'Average classification rate over all runs: %f'%(average)
     return (scores,average)
 
+def crossValidation(dataset,folds=10,setFunc = setEntropy, infoFunc = infoGain, seed = None, workers = None):
+    """
+    k-fold cross validation: the examples are shuffled and split into folds, and
+    each fold is tested on a tree made from all the others. Raises a ValueError
+    unless there are at least two folds and no more than examples, so that no
+    test or training set is empty.
+    
+    Args:
+        dataset (tuple): examples, attrValues, labelName and labelValues, as returned by the get*Dataset functions
+        folds (int): the number of folds
+        setFunc (func): the function to score classes (ie setEntropy or giniIndex)
+        infoFunc (func): the function to score gain of attributes (ie infoGain or giniGain)
+        seed (hashable): the seed of the shuffle, None for a different one every time
+        workers (int): number of worker processes, see evaluateSplits
+    Returns:
+        list<dictionary<str,object>>
+        The result of each fold, as described in evaluateSplits.
+    """
+    if folds < 2 or folds > len(dataset[0]):
+        raise ValueError('cannot split %d examples into %d folds' % (len(dataset[0]), folds))
+    rng = random.Random(seed)
+    order = range(len(dataset[0]))
+    rng.shuffle(order)
+    tests = [sorted(order[fold::folds]) for fold in xrange(folds)]
+    return evaluateSplits(dataset, tests, setFunc, infoFunc, workers)
+
+def repeatedHoldout(dataset,runs=20,testSize=200,setFunc = setEntropy, infoFunc = infoGain, seed = None, workers = None):
+    """
+    Repeated holdout: every run tests a tree made from all the examples but a
+    random sample of testSize of them on that sample. Raises a ValueError unless
+    testSize is at least 1 and leaves at least one example to train on.
+    
+    Args:
+        dataset (tuple): examples, attrValues, labelName and labelValues, as returned by the get*Dataset functions
+        runs (int): the number of runs
+        testSize (int): the number of test examples in each run
+        setFunc (func): the function to score classes (ie setEntropy or giniIndex)
+        infoFunc (func): the function to score gain of attributes (ie infoGain or giniGain)
+        seed (hashable): the seed of the samples, None for different ones every time
+        workers (int): number of worker processes, see evaluateSplits
+    Returns:
+        list<dictionary<str,object>>
+        The result of each run, as described in evaluateSplits.
+    """
+    if testSize < 1 or testSize >= len(dataset[0]):
+        raise ValueError('cannot test on %d of %d examples' % (testSize, len(dataset[0])))
+    rng = random.Random(seed)
+    tests = [sorted(rng.sample(xrange(len(dataset[0])), testSize)) for r in xrange(runs)]
+    return evaluateSplits(dataset, tests, setFunc, infoFunc, workers)
+
+"""
+The examples and tree settings in a worker process of evaluateSplits, as a tuple
+(examples, training, labelName, attrValues, setFunc, infoFunc). Set by startSplitWorker.
+"""
+splitWorkerState = None
+
+def startSplitWorker(examples,training,attrValues,labelName,setFunc,infoFunc):
+    global splitWorkerState
+    splitWorkerState = (examples, training, attrValues, labelName, setFunc, infoFunc)
+
+def splitWorker(job):
+    """
+    Trains a tree on every example not in test and tests it on those in test.
+    """
+    index, test = job
+    examples, training, attrValues, labelName, setFunc, infoFunc = splitWorkerState
+    testSet = set(test)
+    start = time.time()
+    train = training.subset([i for i in xrange(len(examples)) if i not in testSet])
+    tree = makeTree(train, attrValues, labelName, setFunc, infoFunc)
+    trainTime = time.time() - start
+    start = time.time()
+    confusion = {}
+    correct = 0
+    for i in test:
+        example = examples[i]
+        label = tree.classify(example)
+        counts = confusion.setdefault(example[labelName], {})
+        counts[label] = counts.get(label, 0) + 1
+        if label == example[labelName]:
+            correct += 1
+    testTime = time.time() - start
+    return {'fold': index, 'accuracy': correct / float(len(test)), 'confusion': confusion, \
+        'trainSize': len(train), 'testSize': len(test), 'trainTime': trainTime, 'testTime': testTime}
+
+def evaluateSplits(dataset,tests,setFunc = setEntropy, infoFunc = infoGain, workers = None):
+    """
+    Tests a tree for each of several test sets, trained on the rest of the
+    examples. The examples are never copied: they are converted once into a
+    ColumnarDataset, every tree is trained on a view of the positions not in its
+    test set, and the worker processes inherit the dataset instead of getting a
+    pickled copy.
+    
+    Args:
+        dataset (tuple): examples, attrValues, labelName and labelValues, as returned by the get*Dataset functions
+        tests (list<list<int>>): the positions of the test examples of each split
+        setFunc (func): the function to score classes (ie setEntropy or giniIndex)
+        infoFunc (func): the function to score gain of attributes (ie infoGain or giniGain)
+        workers (int): number of worker processes, defaults to the number of cores. 0 evaluates in this process.
+    Returns:
+        list<dictionary<str,object>>
+        For each split in order, a dictionary with its index 'fold', 'accuracy', the
+        'confusion' matrix as a dictionary from actual to predicted label to count,
+        'trainSize', 'testSize', and 'trainTime' and 'testTime' in seconds.
+    """
+    global splitWorkerState
+    examples,attrValues,labelName,labelValues = dataset
+    training = examples
+    if not isinstance(examples, ColumnarDataset):
+        training = makeColumnarDataset(examples, attrValues, labelName, labelValues)
+    state = (examples, training, attrValues, labelName, setFunc, infoFunc)
+    jobs = list(enumerate(tests))
+    if workers == 0:
+        previousState = splitWorkerState
+        splitWorkerState = state
+        try:
+            return [splitWorker(job) for job in jobs]
+        finally:
+            splitWorkerState = previousState
+
+    pool = multiprocessing.Pool(workers, startSplitWorker, state)
+    try:
+        results = list(pool.imap_unordered(splitWorker, jobs))
+    finally:
+        pool.terminate()
+        pool.join()
+    results.sort(key=lambda result: result['fold'])
+    return results
+
 def evaluateTree(tree,testExamples,labelName):    
     """
     Simple function to get the correct classification ratio for a given DTree 
@@ -77,6 +207,185 @@ def testDummySet2(setFunc = setEntropy, infoFunc = infoGain):
     printDemarcation()
     return (tree,evaluation)
 
+def makeColumnarModes(dataset):
+    """
+    Converts the examples of a dataset into a ColumnarDataset with numpy, if it is
+    installed, and without. A dataset keeps the kind of columns it was made with.
+    
+    Args:
+        dataset (tuple): examples, attrValues, labelName and labelValues, as returned by the get*Dataset functions
+    Returns:
+        list<tuple<str,ColumnarDataset>>
+        The name of each kind and the examples converted.
+    """
+    examples,attrValues,labelName,labelValues = dataset
+    datasets = []
+    numpy = DataInterface.numpy
+    if numpy is not None:
+        datasets.append(('columnar', makeColumnarDataset(examples, attrValues, labelName, labelValues)))
+    DataInterface.numpy = None
+    try:
+        datasets.append(('columnar without numpy', makeColumnarDataset(examples, attrValues, labelName, labelValues)))
+    finally:
+        DataInterface.numpy = numpy
+    return datasets
+
+def buildTreeModes(dataset,setFunc = setEntropy, infoFunc = infoGain, q = None):
+    """
+    Builds a tree of the dataset in every way makeTree can build one: scoring the
+    attributes one by one on the list of examples, as for any gainFunc but infoGain
+    and giniGain, from count tables of the list of examples, and from a
+    ColumnarDataset of them with and without numpy, and in parallel. Only the first
+    copies the examples into a new list for every child, the others partition one
+    buffer of example indices. The parallel build uses two worker processes however
+    many CPUs there are, unlike makeTree with getWorkerCount, and hands them every
+    node: each node with two examples or more has its tables counted by the workers
+    and each subtree of one example is built by one.
+    
+    Args:
+        dataset (tuple): examples, attrValues, labelName and labelValues, as returned by the get*Dataset functions
+        setFunc (func): the function to score classes (ie setEntropy or giniIndex)
+        infoFunc (func): the function to score gain of attributes (ie infoGain or giniGain)
+        q (float): the Chi-Squared pruning parameter of makePrunedTree, None for makeTree
+    Returns:
+        list<tuple<str,Tree>>
+        The name of each mode and its tree, the attributes scored one by one first.
+    """
+    examples,attrValues,labelName,labelValues = dataset
+    def build(examples,gainFunc):
+        if q is None:
+            return makeTree(examples, attrValues, labelName, setFunc, gainFunc)
+        return makePrunedTree(examples, attrValues, labelName, setFunc, gainFunc, q)
+    scoreEach = lambda examples,attrName,values,className: infoFunc(examples,attrName,values,className)
+    trees = [('scoring attributes one by one', build(examples, scoreEach))]
+    for mode,modeExamples in [('list', examples)] + makeColumnarModes(dataset):
+        trees.append((mode, build(modeExamples, infoFunc)))
+    shared = getTrainingView(examples, attrValues, labelName, infoFunc).share()
+    parallel = ParallelBuild(shared, attrValues, labelName, setFunc, infoFunc, q, 2, 1)
+    trees.append(('in parallel', Tree(parallel.build(attrValues.keys(), getMostCommonClass(shared, labelName)))))
+    return trees
+
+def testTreeModes(setFunc = setEntropy, infoFunc = infoGain, q = 0.2):
+    """
+    Builds the trees of both dummy datasets in every mode of buildTreeModes, with
+    makeTree and with makePrunedTree, and compares each with the first one built
+    the same way. They should all be the same.
+    
+    Args:
+        setFunc (func): the function to score classes (ie setEntropy or giniIndex)
+        infoFunc (func): the function to score gain of attributes (ie infoGain or giniGain)
+        q (float): the Chi-Squared pruning parameter of the pruned trees
+    Returns:
+        list<tuple<str,str>>
+        The dataset and mode of every tree that differs, empty if none does.
+    """
+    differences = []
+    for name,getDataset in (('dummy dataset 1', getDummyDataset1), ('dummy dataset 2', getDummyDataset2)):
+        for treeName,treeQ in (('Tree', None), ('Pruned tree', q)):
+            trees = buildTreeModes(getDataset(), setFunc, infoFunc, treeQ)
+            reference = str(trees[0][1])
+            for mode,tree in trees[1:]:
+                same = str(tree) == reference
+                print '%s of %s built %s: %s'%(treeName, name, mode, 'same' if same else 'DIFFERENT')
+                if not same:
+                    differences.append((name, treeName.lower() + ' ' + mode))
+    printDemarcation()
+    return differences
+
+def testCountTables(infoFunc = infoGain):
+    """
+    Scores every attribute of both dummy datasets with infoFunc, one attribute at a
+    time, and from the getCountTables of the list of examples and of a
+    ColumnarDataset with and without numpy. The scores should all be the same.
+    
+    Args:
+        infoFunc (func): the function to score gain of attributes (infoGain or giniGain)
+    Returns:
+        list<tuple<str,str,str>>
+        The dataset, attribute and kind of examples of every score that differs,
+        empty if none does.
+    """
+    countFunc = countGainFuncs[infoFunc]
+    differences = []
+    for name,getDataset in (('dummy dataset 1', getDummyDataset1), ('dummy dataset 2', getDummyDataset2)):
+        dataset = getDataset()
+        examples,attrValues,labelName,labelValues = dataset
+        attrNames = attrValues.keys()
+        found = len(differences)
+        for kind,counted in [('list', examples)] + makeColumnarModes(dataset):
+            classCounts = getClassCounts(counted, labelName).values()
+            tables = getCountTables(counted, attrNames, attrValues, labelName)
+            for attrName in attrNames:
+                if abs(countFunc(classCounts, tables[attrName]) - infoFunc(examples, attrName, attrValues[attrName], labelName)) > 1e-9:
+                    differences.append((name, attrName, kind))
+        print 'Count tables of %s: %s'%(name, 'same scores' if len(differences) == found else 'DIFFERENT scores')
+    printDemarcation()
+    return differences
+
+def testEvaluationModes(setFunc = setEntropy, infoFunc = infoGain, folds = 5, seed = 0):
+    """
+    Runs crossValidation and repeatedHoldout on both dummy datasets, as a list and
+    as a ColumnarDataset, in this process and on two worker processes. With the
+    same seed every run should give the same results but for the timings, and the
+    test sets of crossValidation should cover every example once.
+    
+    Args:
+        setFunc (func): the function to score classes (ie setEntropy or giniIndex)
+        infoFunc (func): the function to score gain of attributes (ie infoGain or giniGain)
+        folds (int): the number of folds, and of runs of repeatedHoldout
+        seed (hashable): the seed of the splits
+    Returns:
+        list<tuple<str,str>>
+        The dataset and mode of every evaluation that differs, empty if none does.
+    """
+    differences = []
+    for name,getDataset in (('dummy dataset 1', getDummyDataset1), ('dummy dataset 2', getDummyDataset2)):
+        dataset = getDataset()
+        examples,attrValues,labelName,labelValues = dataset
+        columnar = (makeColumnarDataset(examples, attrValues, labelName, labelValues), attrValues, labelName, labelValues)
+        for evaluation,evaluate in (('crossValidation', lambda dataset,workers: crossValidation(dataset, folds, setFunc, infoFunc, seed, workers)), \
+                ('repeatedHoldout', lambda dataset,workers: repeatedHoldout(dataset, folds, len(examples) / folds, setFunc, infoFunc, seed, workers))):
+            results = []
+            for mode,modeDataset,workers in (('list', dataset, 0), ('columnar', columnar, 0), ('list in parallel', dataset, 2)):
+                results.append((mode, [dict((key, value) for key, value in result.items() if not key.endswith('Time')) for result in evaluate(modeDataset, workers)]))
+            reference = results[0][1]
+            if evaluation == 'crossValidation' and sum(result['testSize'] for result in reference) != len(examples):
+                differences.append((name, evaluation))
+            for mode,modeResults in results[1:]:
+                same = modeResults == reference
+                print '%s of %s %s: %s'%(evaluation, name, mode, 'same' if same else 'DIFFERENT')
+                if not same:
+                    differences.append((name, evaluation + ' ' + mode))
+    printDemarcation()
+    return differences
+
+def testEmptySplits():
+    """
+    Checks that crossValidation and repeatedHoldout raise a ValueError for the
+    numbers of folds and test examples that would leave a test set or a training
+    set empty.
+    
+    Returns:
+        list<str>
+        The calls that did not raise, empty if all did.
+    """
+    dataset = getDummyDataset1()
+    size = len(dataset[0])
+    missing = []
+    for call,evaluate in (('crossValidation(folds=0)', lambda: crossValidation(dataset, 0, workers=0)), \
+            ('crossValidation(folds=1)', lambda: crossValidation(dataset, 1, workers=0)), \
+            ('crossValidation(folds=%d)'%(size + 1), lambda: crossValidation(dataset, size + 1, workers=0)), \
+            ('repeatedHoldout(testSize=0)', lambda: repeatedHoldout(dataset, 1, 0, workers=0)), \
+            ('repeatedHoldout(testSize=%d)'%size, lambda: repeatedHoldout(dataset, 1, size, workers=0))):
+        try:
+            evaluate()
+            missing.append(call)
+            print '%s: no error'%call
+        except ValueError as e:
+            print '%s: %s'%(call, e)
+    printDemarcation()
+    return missing
+
 def testConnect4(setFunc = setEntropy, infoFunc = infoGain):
     """Correct classification averate rate is about 0.75"""
     examples,attrValues,labelName,labelValues = getConnect4Dataset() 
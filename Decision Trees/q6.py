@@ -1,6 +1,11 @@
-from Testing import testDummySet1, testDummySet2, testConnect4, testCar
+from Testing import testDummySet1, testDummySet2, testConnect4, testCar, testTreeModes, testCountTables
+from Testing import testEvaluationModes, testEmptySplits
 
 testDummySet1()
 testDummySet2()
+testTreeModes()
+testCountTables()
+testEvaluationModes()
+testEmptySplits()
 testConnect4()
 testCar()